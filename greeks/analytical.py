@@ -1,9 +1,10 @@
 import numpy as np
-from scipy.stats import norm
 
-from methods.close_form import european_option_bs_cf
-from utils.constants import ONE_DAY
-from utils.flag_utils import cp2omega
+from methods.close_form import f_image_counts, heston_integrals, image_counts, ragged_images, split_pair
+from utils.configs import IMAGE_SERIES_CONFIG
+from utils.constants import GREEKS, ONE_DAY
+from utils.flag_utils import cp2omega, get_barrier_flag, get_double_barrier_flag, get_double_touch_flag, get_touch_flag
+from utils.normal_utils import ncdf, npdf, ncdf_pair
 
 
 class BSGreeks:
@@ -24,11 +25,17 @@ class BSGreeks:
         self.v = sigma * np.sqrt(T)
         self.d1 = (np.log(S / K) + ((r - q) * T + 0.5 * self.v**2)) / self.v
         self.d2 = self.d1 - self.v
-        self.pd1 = norm.pdf(self.d1)
-        self.nd1 = norm.cdf(self.omega * self.d1)
-        self.nd2 = norm.cdf(self.omega * self.d2)
+        self.pd1 = npdf(self.d1)
+        self.nd1, self.nd2 = ncdf_pair(self.omega, self.d1, self.d2)
 
-        self.price = european_option_bs_cf(option_type, S, K, T, r, q, sigma)
+        # price from the same intermediates as the greeks
+        self.price = self.omega * (S * self.disc_q * self.nd1 - K * self.disc_r * self.nd2)
+
+    def table(self) -> dict:
+        # price and every greek of GREEKS as columns of one shape
+        names = ["price"] + GREEKS
+        columns = np.broadcast_arrays(self.price, *(getattr(self, g.lower()) for g in GREEKS))
+        return dict(zip(names, columns))
 
     @property
     def delta(self):
@@ -44,10 +51,7 @@ class BSGreeks:
 
     @property
     def rho(self):
-        if self.r - self.q == 0:
-            return -self.T * self.price
-        else:
-            return self.omega * self.K * self.T * self.disc_r * self.nd2 / 100
+        return self.omega * self.K * self.T * self.disc_r * self.nd2 / 100
 
     @property
     def theta(self):
@@ -63,7 +67,362 @@ class BSGreeks:
     def volga(self):
         return self.vega * (self.d1 * self.d2) / (100 * self.sigma)
 
+    @property
+    def speed(self):
+        return -self.gamma / self.S * (self.d1 / self.v + 1)
+
+    @property
+    def zomma(self):
+        return self.gamma * (self.d1 * self.d2 - 1) / self.sigma / 100
+
+    @property
+    def color(self):
+        g = self.pd1 * self.disc_q / (2 * self.S * self.T * self.v) * \
+            (2 * self.q * self.T + 1 + (2 * (self.r - self.q) * self.T - self.d2 * self.v) * self.d1 / self.v)
+        return g * ONE_DAY
+
+    @property
+    def charm(self):
+        g = self.omega * self.q * self.disc_q * self.nd1 \
+            - self.disc_q * self.pd1 * (2 * (self.r - self.q) * self.T - self.d2 * self.v) / (2 * self.T * self.v)
+        return g * ONE_DAY
+
+    @property
+    def veta(self):
+        g = self.S * self.disc_q * self.pd1 * np.sqrt(self.T) * \
+            (self.q + (self.r - self.q) * self.d1 / self.v - (1 + self.d1 * self.d2) / (2 * self.T))
+        return g / 100 * ONE_DAY
+
 
 class HestonGreeks:
-    def __init__(self, option_type, S, K, T, r, q, sigma):
-        pass
+
+    def __init__(self, option_type, S, K, T, r, q, sigma, kappa=2.0, vbar=0.04, xi=0.3, corr=-0.7):
+        self.option_type = option_type
+        self.S = S
+        self.K = K
+        self.T = T
+        self.r = r
+        self.q = q
+        self.sigma = sigma
+        self.kappa = kappa
+        self.vbar = vbar
+        self.xi = xi
+        self.corr = corr
+
+        # derived quantities, call = S * disc_q - A * I0 with the Lewis integrals I_j sharing one quadrature
+        self.omega = cp2omega(option_type)
+        self.disc_r = np.exp(-r * T)
+        self.disc_q = np.exp(-q * T)
+        self.A = np.sqrt(S * K) * np.exp(-0.5 * (r + q) * T) / np.pi
+        k = np.log(S / K) + (r - q) * T
+        shape = np.broadcast(k, T, sigma, kappa, vbar, xi, corr).shape
+        moments = lambda u, D, dT: [np.ones_like(D), 1j * u, -u ** 2, D, 1j * u * D, D ** 2, dT]
+        I = heston_integrals(k, T, sigma ** 2, kappa, vbar, xi, corr, moments)
+        (self.I0, self.I1, self.I2, self.ID, self.I1D, self.IDD, self.IT) = \
+            (I[:, j].reshape(shape)[()] for j in range(7))
+
+        self.price = S * self.disc_q - self.A * self.I0 - (self.omega == -1) * (S * self.disc_q - K * self.disc_r)
+
+    @property
+    def delta(self):
+        call_delta = self.disc_q - self.A / self.S * (self.I0 / 2 + self.I1)
+        return call_delta - (self.omega == -1) * self.disc_q
+
+    @property
+    def gamma(self):
+        return self.A / self.S ** 2 * (self.I0 / 4 - self.I2)
+
+    @property
+    def vega(self):
+        return -self.A * 2 * self.sigma * self.ID / 100
+
+    @property
+    def rho(self):
+        call_rho = self.A * self.T * (self.I0 / 2 - self.I1)
+        return (call_rho - (self.omega == -1) * self.K * self.T * self.disc_r) / 100
+
+    @property
+    def theta(self):
+        dT = -self.q * self.S * self.disc_q + 0.5 * (self.r + self.q) * self.A * self.I0 \
+            - self.A * ((self.r - self.q) * self.I1 + self.IT)
+        g = -dT - (self.omega == -1) * (self.q * self.S * self.disc_q - self.r * self.K * self.disc_r)
+        return g * ONE_DAY
+
+    @property
+    def vanna(self):
+        return -self.A / self.S * 2 * self.sigma * (self.ID / 2 + self.I1D) / 100
+
+    @property
+    def volga(self):
+        return -self.A * (2 * self.ID + 4 * self.sigma ** 2 * self.IDD) / 100 ** 2
+
+
+# Touch and barrier greeks: prices are sums of coef * exp(E) * N(Z), jets are [value, d/dx, d/dsigma, d/dr, d/dT]
+def lift_arrays(*args) -> tuple:
+    # broadcast shape and the inputs left-padded to its ndim
+    shape = np.broadcast_shapes(*(np.shape(a) for a in args))
+    return shape, [np.reshape(a, (1,) * (len(shape) - np.ndim(a)) + np.shape(a)) for a in args]
+
+
+def jet(value, dx=0.0, dsigma=0.0, dr=0.0, dT=0.0) -> np.ndarray:
+    return np.stack(np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (value, dx, dsigma, dr, dT))))
+
+
+def jet_mul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.concatenate([a[:1] * b[:1], a[1:] * b[:1] + a[:1] * b[1:]])
+
+
+def jet_div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    ratio = a[:1] / b[:1]
+    return np.concatenate([ratio, (a[1:] - ratio * b[1:]) / b[:1]])
+
+
+def jet_sqrt(a: np.ndarray) -> np.ndarray:
+    root = np.sqrt(a[:1])
+    return np.concatenate([root, 0.5 * a[1:] / root])
+
+
+def term(coef, E: np.ndarray, Z: np.ndarray = None) -> np.ndarray:
+    # [V, V_x, V_xx, V_sigma, V_r, V_T] of V = coef * exp(E) * N(Z), or coef * exp(E) without Z
+    e = coef * np.exp(E[0])
+    (V, A, Z) = (e, 0.0, np.zeros_like(E)) if Z is None else (e * ncdf(Z[0]), e * npdf(Z[0]), Z)
+    d = V * E[1:] + A * Z[1:]
+    V_xx = V * E[1] ** 2 + A * Z[1] * (2 * E[1] - Z[0] * Z[1])
+    return np.stack([V, d[0], V_xx, d[1], d[2], d[3]])
+
+
+def drift_jets(T, r, q, sigma) -> tuple:
+    # v = sigma * sqrt(T), mu = (r - q) / sigma ** 2 - 1/2 and lbd = sqrt(mu ** 2 + 2 * max(0, r) / sigma ** 2)
+    sqrt_T = np.sqrt(T)
+    v = jet(sigma * sqrt_T, 0, sqrt_T, 0, 0.5 * sigma / sqrt_T)
+    mu = jet((r - q) / sigma ** 2 - 0.5, 0, -2 * (r - q) / sigma ** 3, 1 / sigma ** 2)
+    r_pos = np.maximum(0, r)
+    lbd = jet_sqrt(jet_mul(mu, mu) + jet(2 * r_pos / sigma ** 2, 0, -4 * r_pos / sigma ** 3, 2 * (r > 0) / sigma ** 2))
+    return v, mu, lbd
+
+
+def hitting_terms(coef, eta, h: np.ndarray, v: np.ndarray, mu: np.ndarray, lam: np.ndarray, log_p: np.ndarray):
+    # coef * P * ((L/S) ** (mu + lam) * N(eta * z) + (L/S) ** (mu - lam) * N(eta * (z - 2 * lam * v))), h = ln(L / S)
+    (z, lam_v) = (jet_div(h, v) + jet_mul(lam, v), jet_mul(lam, v))
+    return term(coef, jet_mul(mu + lam, h) + log_p, eta * z) + \
+        term(coef, jet_mul(mu - lam, h) + log_p, eta * (z - 2 * lam_v))
+
+
+def european_terms(omega, S, K, T, r, q, v: np.ndarray) -> np.ndarray:
+    # omega * (S * dfq * N(omega * d1) - K * dfr * N(omega * d2))
+    d1 = jet_div(jet(np.log(S / K) + (r - q) * T, 1, 0, T, r - q), v) + 0.5 * v
+    return term(omega, jet(np.log(S) - q * T, 1, 0, 0, -q), omega * d1) + \
+        term(-omega, jet(np.log(K) - r * T, 0, 0, -T, -r), omega * (d1 - v))
+
+
+def rebate_terms(shape, R, PaE, t, v, var, mu_hat, mu_prime, xl, xh, du_flag, x, dfr) -> np.ndarray:
+    # rebate image series as sums of the value and four moments per trade, g_k = n(Z_k+) * e_k = n(Z_k-) / e_k
+    mu = np.where(PaE, mu_hat, mu_prime)
+    log_scale = np.where(PaE, dfr, jet_div(jet_mul(mu_hat - mu_prime, x), var))
+    (c, m, w) = (jet_div(mu, var), jet_mul(mu, t), xh - xl)
+    flat = lambda a: np.broadcast_to(a, shape).ravel()
+    (c0, m0, v0, w0, x0, C) = (flat(a) for a in (c[0], m[0], v[0], w[0], x[0], R * np.exp(log_scale[0] + c[0] * x[0])))
+    (n_pos, n_neg) = image_counts(v0, c0, m0, du_flag * x0, w0, x0, IMAGE_SERIES_CONFIG)
+
+    (row, k) = ragged_images(n_pos, n_neg)
+    (c0, m0, v0, w0, x0) = (a[row] for a in (c0, m0, v0, w0, x0))
+    s = np.where(k >= 0, 1, -1)
+    u = s * (du_flag * x0 + 2 * k * w0)
+    e = np.exp(c0 * u)
+    (N_up, N_dn, g) = (ncdf((-u - m0) / v0) * e, ncdf((m0 - u) / v0) / e, npdf((u + m0) / v0) * e)
+    moments = [s * (N_up + N_dn), s * (N_up - N_dn) * u, N_up - N_dn, s * g * u, g]
+    (V, V_u, V_s, g_u, g_s) = ((C * np.bincount(row, weights=y, minlength=C.size)).reshape(shape) for y in moments)
+
+    # E_x = alpha -+ beta * s and Z_x = s * du_flag / v for the up / down term of an image
+    (alpha, beta, vol) = (log_scale[1] - c[0], c[0] * du_flag, v[0])
+    V_x = alpha * V - beta * V_s + 2 * du_flag * g_s / vol
+    V_xx = (alpha ** 2 + c[0] ** 2) * V - 2 * alpha * beta * V_s + 4 * du_flag * alpha * g_s / vol + 2 * g_u / vol ** 3
+    V_p = log_scale[2:] * V + c[2:] * (x[0] * V + V_u) + 2 * v[2:] / vol ** 2 * g_u
+    return np.concatenate([np.stack(np.broadcast_arrays(V, V_x, V_xx)), np.broadcast_to(V_p, (3,) + shape)])
+
+
+def corridor_terms(shape, omega, K, S, dfr, m, s, xl, xh, z1, z2) -> np.ndarray:
+    # dfr * omega * sum over the direct (U = u) and reflected (U = u - 2 * xh) images of P(U, a1) - P(U, a2)
+    c = jet_div(m, jet_mul(s, s))
+    a1 = np.maximum(z1[0], xl[0])
+    a2 = np.maximum(np.minimum(z2[0], xh[0]), a1)  # empty integration range when the strike is outside the corridor
+    flat = lambda a: np.broadcast_to(a, shape).ravel()
+    (S, K, c0, m0, s0, xl0, xh0, a1, a2) = (flat(a) for a in (S, K, c[0], m[0], s[0], xl[0], xh[0], a1, a2))
+    n = f_image_counts(s0, xl0, xh0, IMAGE_SERIES_CONFIG)
+
+    (row, k) = ragged_images(n, n)
+    (S, K, c0, m0, s0, xh0) = (a[row] for a in (S, K, c0, m0, s0, xh0))
+    u = 2 * k * (xh0 - xl0[row])
+    a = np.stack([a1[row], a2[row]])[None]  # endpoints on axis 1, direct / reflected images on axis 0
+    (U, U_x) = (np.stack([u, u - 2 * xh0])[:, None], np.array([0, 2])[:, None, None])
+    (L, y, g) = (S * np.exp(a), (U - m0 + a) / s0, np.exp(-c0 * U))
+    (Q1, Q0, B) = (g * S * np.exp(0.5 * s0 ** 2 - U + m0) * ncdf(s0 - y), g * K * ncdf(-y), g * npdf(y))
+    P = Q1 - Q0
+
+    (E1_x, E0_x, zeta) = (1 - (1 + c0) * U_x, -c0 * U_x, (1 - U_x) / s0)
+    P_x = Q1 * E1_x - Q0 * E0_x + zeta * B * (L - K)
+    P_xx = Q1 * E1_x ** 2 + zeta * B * L * (2 * E1_x - (s0 - y) * zeta) \
+        - Q0 * E0_x ** 2 - zeta * B * K * (2 * E0_x + y * zeta)
+    (P_c, P_m, P_s) = (-U * P, Q1 - B * (K - L) / s0, s0 * Q1 + B * L + B * (L - K) * y / s0)
+
+    sign = np.array([[1, -1], [-1, 1]])[:, :, None]
+    image_sum = lambda y: np.bincount(row, weights=np.sum(sign * y, axis=(0, 1)), minlength=n.size).reshape(shape)
+    (V, V_x, V_xx, V_c, V_m, V_s) = (image_sum(y) for y in (P, P_x, P_xx, P_c, P_m, P_s))
+    scale = omega * np.exp(dfr[0])
+    V_p = dfr[2:] * scale * V + scale * (c[2:] * V_c + m[2:] * V_m + s[2:] * V_s)
+    return np.concatenate([scale * np.stack([V, V_x, V_xx]), np.broadcast_to(V_p, (3,) + shape)])
+
+
+class BarrierGreeks:
+    # greeks in the units of BSGreeks from d = [V, V_x, V_xx, V_sigma, V_r, V_T], x = ln S
+
+    def __init__(self, shape: tuple, S, d: np.ndarray):
+        self.S = S
+        self.d = np.broadcast_to(d, d.shape[:1] + shape)
+        self.price = self.d[0][()]
+
+    @property
+    def delta(self):
+        return (self.d[1] / self.S)[()]
+
+    @property
+    def gamma(self):
+        return ((self.d[2] - self.d[1]) / self.S ** 2)[()]
+
+    @property
+    def vega(self):
+        return (self.d[3] / 100)[()]
+
+    @property
+    def rho(self):
+        return (self.d[4] / 100)[()]
+
+    @property
+    def theta(self):
+        return (-self.d[5] * ONE_DAY)[()]
+
+
+class SingleTouchGreeks(BarrierGreeks):
+
+    def __init__(self, option_type, S, T, r, q, sigma, L, rbt=1.0, PaE=True):
+        (eta, touch) = get_touch_flag(option_type)
+        (shape, (eta, touch, S, T, r, q, sigma, L, rbt, PaE)) = lift_arrays(eta, touch, S, T, r, q, sigma, L, rbt, PaE)
+        (v, mu, lbd) = drift_jets(T, r, q, sigma)
+        dfr = jet(-r * T, 0, 0, -T, -r)
+
+        # PaE touch and no-touch use lam = mu discounted by dfr, PaH touch lam = lbd undiscounted
+        pah = np.logical_and(touch, np.logical_not(PaE))
+        (lam, log_p) = (np.where(pah, lbd, mu), np.where(pah, 0.0, dfr))
+        d = hitting_terms(rbt * np.where(touch, 1, -1), eta, jet(np.log(L / S), -1), v, mu, lam, log_p) \
+            + term(rbt * (1 - touch), dfr)
+
+        hit = eta * (S - L) <= 0
+        if np.any(hit):
+            d = np.where(hit, term(touch * rbt, PaE * dfr), d)
+        super().__init__(shape, S, d)
+
+
+# coefficients of I1, ..., I6 by (knock-out, down call / up put, strike beyond the barrier)
+BARRIER_WEIGHTS = np.array([
+    [[[1, 0, 0, 0, 1, 0], [0, 1, -1, 1, 1, 0]], [[1, -1, 0, 1, 1, 0], [0, 0, 1, 0, 1, 0]]],     # knock-in
+    [[[0, 0, 0, 0, 0, 1], [1, -1, 1, -1, 0, 1]], [[0, 1, 0, -1, 0, 1], [1, 0, -1, 0, 0, 1]]],   # knock-out
+])
+
+
+class SingleBarrierGreeks(BarrierGreeks):
+
+    def __init__(self, option_type, S, K, T, r, q, sigma, L, rbt=1.0, PaE=True):
+        (eta, knockout, omega) = get_barrier_flag(option_type)
+        (shape, (eta, knockout, omega, S, K, T, r, q, sigma, L, rbt, PaE)) = \
+            lift_arrays(eta, knockout, omega, S, K, T, r, q, sigma, L, rbt, PaE)
+        (v, mu, lbd) = drift_jets(T, r, q, sigma)
+        (dfr, phi) = (jet(-r * T, 0, 0, -T, -r), omega)
+        (asset, cash) = (jet(np.log(S) - q * T, 1, 0, 0, -q), jet(np.log(K) - r * T, 0, 0, -T, -r))
+
+        # the I1, ..., I6 of get_barrier_para, with (L/S) ** p as exp(p * h)
+        h = jet(np.log(L / S), -1)
+        mu1 = mu.copy()
+        mu1[0] += 1
+        (p1, p0, mu1_v) = (jet_mul(2 * mu1, h), jet_mul(2 * mu, h), jet_mul(mu1, v))
+        (x1, x2, y1, y2) = (jet_div(jet(np.log(S / K), 1), v) + mu1_v, jet_div(jet(np.log(S / L), 1), v) + mu1_v,
+                            jet_div(jet(np.log(L ** 2 / (S * K)), -1), v) + mu1_v, jet_div(h, v) + mu1_v)
+        parts = [
+            lambda: term(phi, asset, phi * x1) + term(-phi, cash, phi * (x1 - v)),
+            lambda: term(phi, asset, phi * x2) + term(-phi, cash, phi * (x2 - v)),
+            lambda: term(phi, asset + p1, eta * y1) + term(-phi, cash + p0, eta * (y1 - v)),
+            lambda: term(phi, asset + p1, eta * y2) + term(-phi, cash + p0, eta * (y2 - v)),
+            lambda: term(rbt, dfr, eta * (x2 - v)) + term(-rbt, dfr + p0, eta * (y2 - v)),
+            lambda: hitting_terms(rbt, eta, h, v, mu, np.where(PaE, mu, lbd), np.where(PaE, dfr, 0.0)),
+        ]
+
+        # only the I's some trade of the batch needs
+        (hit, K_L) = (eta * (S - L) <= 0, eta * (K - L) > 0)
+        w = BARRIER_WEIGHTS[(knockout == 1) * 1, (eta * omega == 1) * 1, K_L * 1]
+        d = sum(w[..., j] * part() for j, part in enumerate(parts) if np.any(w[..., j]))
+
+        if np.any(hit):
+            d_hit = np.where(knockout == 1, term(rbt, PaE * dfr), european_terms(omega, S, K, T, r, q, v))
+            d = np.where(hit, d_hit, d)
+        super().__init__(shape, S, d)
+
+
+def double_jets(T, r, q, sigma) -> tuple:
+    # jets of t, v, var, mu_hat, mu_prime and dfr of the double barrier formulas
+    (t, sd) = (jet(T, 0, 0, 0, 1), jet(sigma, 0, 1))
+    var = jet_mul(sd, sd)
+    mu_hat = jet(r - q - sigma ** 2 / 2, 0, -sigma, 1)
+    mu_prime = jet_sqrt(jet_mul(mu_hat, mu_hat) + 2 * jet_mul(jet(r, 0, 0, 1), var))
+    return t, jet_sqrt(jet_mul(var, t)), var, mu_hat, mu_prime, jet(-r * T, 0, 0, -T, -r)
+
+
+class DoubleTouchGreeks(BarrierGreeks):
+
+    def __init__(self, option_type, S, T, r, q, sigma, Ll, Lh, rbt=1.0, PaE=True):
+        (with_l, with_u, no_touch) = get_double_touch_flag(option_type)
+        (lR, uR), (lPaE, uPaE) = split_pair(rbt), split_pair(PaE)
+        (shape, (with_l, with_u, no_touch, S, T, r, q, sigma, Ll, Lh, lR, uR, lPaE, uPaE)) = \
+            lift_arrays(with_l, with_u, no_touch, S, T, r, q, sigma, Ll, Lh, lR, uR, lPaE, uPaE)
+        (uR, lPaE, uPaE) = (np.where(no_touch, lR, uR), np.logical_or(lPaE, no_touch), np.logical_or(uPaE, no_touch))
+
+        (t, v, var, mu_hat, mu_prime, dfr) = double_jets(T, r, q, sigma)
+        (xl, xh) = (jet(np.log(Ll / S), -1), jet(np.log(Lh / S), -1))
+        rebate = lambda R, P, du, x: rebate_terms(shape, R, P, t, v, var, mu_hat, mu_prime, xl, xh, du, x, dfr)
+
+        d = 0.0
+        if np.any(with_l):
+            d = d + with_l * rebate(lR, lPaE, -1, xl)
+        if np.any(with_u):
+            d = d + with_u * rebate(uR, uPaE, 1, xh)
+        d = np.where(no_touch, term(lR, dfr) - d, d)
+
+        hit_lb, hit_ub = (S <= Ll), (S >= Lh)
+        if np.any(hit_lb | hit_ub):
+            d_hit = np.where(hit_ub, term(with_u * uR, uPaE * dfr), term(with_l * lR, lPaE * dfr))
+            d = np.where(hit_lb | hit_ub, (1 - no_touch) * d_hit, d)
+        super().__init__(shape, S, d)
+
+
+class DoubleBarrierGreeks(BarrierGreeks):
+
+    def __init__(self, option_type, S, K, T, r, q, sigma, Ll, Lh, rbt=1.0, PaE=True):
+        (knockout, omega) = get_double_barrier_flag(option_type)
+        (lR, uR), (lPaE, uPaE) = split_pair(rbt), split_pair(PaE)
+        (shape, (knockout, omega, S, K, T, r, q, sigma, Ll, Lh, lR, uR, lPaE, uPaE)) = \
+            lift_arrays(knockout, omega, S, K, T, r, q, sigma, Ll, Lh, lR, uR, lPaE, uPaE)
+        ki = knockout == -1
+        (uR, lPaE, uPaE) = (np.where(ki, lR, uR), np.logical_or(lPaE, ki), np.logical_or(uPaE, ki))
+
+        (t, v, var, mu_hat, mu_prime, dfr) = double_jets(T, r, q, sigma)
+        (x0, xl, xh) = (jet(np.log(K / S), -1), jet(np.log(Ll / S), -1), jet(np.log(Lh / S), -1))
+        (z1, z2) = (np.where(omega == 1, x0, xl), np.where(omega == 1, xh, x0))
+        d = corridor_terms(shape, omega, K, S, dfr, jet_mul(mu_hat, t), v, xl, xh, z1, z2) \
+            + rebate_terms(shape, lR, lPaE, t, v, var, mu_hat, mu_prime, xl, xh, -1, xl, dfr) \
+            + rebate_terms(shape, uR, uPaE, t, v, var, mu_hat, mu_prime, xl, xh, 1, xh, dfr)
+
+        hit_lb, hit_ub = (S <= Ll), (S >= Lh)
+        if np.any(hit_lb | hit_ub):
+            d = np.where(hit_ub, term(uR, uPaE * dfr), np.where(hit_lb, term(lR, lPaE * dfr), d))
+
+        if np.any(ki):
+            d = np.where(ki, european_terms(omega, S, K, T, r, q, v) - d + term(lR, dfr), d)
+        super().__init__(shape, S, d)
@@ -0,0 +1,297 @@
+from functools import cached_property
+
+import numpy as np
+from scipy.special import ndtr
+
+from utils.constants import ONE_DAY
+from utils.normal_utils import npdf
+
+# forward-mode AD on second-order dual numbers, second derivatives for the AD_PAIRS only
+AD_VARIABLES = ["S", "sigma", "r", "T"]
+AD_PAIRS = [("S", "S"), ("S", "sigma"), ("sigma", "sigma")]
+
+
+class Dual:
+    # value d[0], gradient d[1:1 + n] and the second derivatives d[1 + n:] of the index pairs, no __len__ so that
+    # np.asarray(val)[()] in the pricers hands the number back
+
+    def __init__(self, d: np.ndarray, n: int, pairs: tuple):
+        self.d = d
+        self.n = n
+        self.pairs = pairs
+
+    @classmethod
+    def variable(cls, x, k: int, n: int, pairs: tuple):
+        # the k-th of n independent variables, at x
+        d = np.zeros((1 + n + len(pairs[0]),) + np.shape(x))
+        (d[0], d[1 + k]) = (x, 1.0)
+        return cls(d, n, pairs)
+
+    @classmethod
+    def constant(cls, x, like):
+        d = np.zeros(like.d.shape[:1] + np.shape(x))
+        d[0] = x
+        return cls(d, like.n, like.pairs)
+
+    def new(self, d: np.ndarray):
+        return Dual(d, self.n, self.pairs)
+
+    @property
+    def shape(self):
+        return self.d.shape[1:]
+
+    @property
+    def ndim(self):
+        return self.d.ndim - 1
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def value(self):
+        return self.d[0]
+
+    @property
+    def grad(self):
+        return self.d[1:1 + self.n]
+
+    @property
+    def hess(self):
+        return self.d[1 + self.n:]
+
+    def lift(self, ndim: int):
+        # leading unit axes up to ndim, so that the parts broadcast like the values
+        extra = ndim - self.ndim
+        return self if extra <= 0 else self.new(self.d.reshape(self.d.shape[:1] + (1,) * extra + self.shape))
+
+    def reshape(self, *shape):
+        shape = shape[0] if len(shape) == 1 and isinstance(shape[0], tuple) else shape
+        return self.new(self.d.reshape(self.d.shape[:1] + tuple(shape)))
+
+    def ravel(self):
+        return self.new(self.d.reshape(self.d.shape[0], -1))
+
+    def __getitem__(self, idx):
+        return self.new(self.d[(slice(None),) + (idx if isinstance(idx, tuple) else (idx,))])
+
+    def __iter__(self):
+        return (self[i] for i in range(self.shape[0]))
+
+    def __repr__(self):
+        return f"Dual(value={self.value!r})"
+
+    # ------------ chain rule -----------------
+    def chain(self, f0, f1, f2):
+        # f(x) for f with value f0, first and second derivatives f1, f2 at x
+        (n, g, (i, j)) = (self.n, self.grad, self.pairs)
+        d = np.empty(self.d.shape)
+        d[0] = f0
+        d[1:1 + n] = f1 * g
+        d[1 + n:] = f1 * self.hess + f2 * g[i] * g[j]
+        return self.new(d)
+
+    def times(self, other):
+        (n, ndim, (i, j)) = (self.n, max(self.ndim, other.ndim), self.pairs)
+        (a, b) = (self.lift(ndim), other.lift(ndim))
+        shape = np.broadcast_shapes(a.shape, b.shape)
+        (av, bv, ag, bg) = (a.value, b.value, a.grad, b.grad)
+        d = np.empty(a.d.shape[:1] + shape)
+        d[0] = av * bv
+        d[1:1 + n] = av * bg + bv * ag
+        d[1 + n:] = av * b.hess + bv * a.hess + ag[i] * bg[j] + bg[i] * ag[j]
+        return self.new(d)
+
+    def scale(self, c):
+        # product with a constant
+        return self.new(self.lift(np.ndim(c)).d * c)
+
+    def shift(self, c):
+        # sum with a constant, which only moves the value
+        a = self.lift(np.ndim(c))
+        shape = np.broadcast_shapes(a.shape, np.shape(c))
+        d = np.array(np.broadcast_to(a.d, a.d.shape[:1] + shape))
+        d[0] += c
+        return self.new(d)
+
+    def plus(self, other):
+        ndim = max(self.ndim, other.ndim)
+        return self.new(self.lift(ndim).d + other.lift(ndim).d)
+
+    def reciprocal(self):
+        x = self.value
+        return self.chain(1 / x, -1 / x ** 2, 2 / x ** 3)
+
+    def power(self, y):
+        x = self.value
+        if isinstance(y, Dual):  # x ** y = exp(y * ln(x)) for an exponent that carries derivatives too
+            return np.exp(y * np.log(self))
+        return self.chain(x ** y, y * x ** (y - 1), y * (y - 1) * x ** (y - 2))
+
+    # ------------ NumPy protocols -----------------
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != "__call__" or kwargs.get("out") is not None:
+            return NotImplemented
+        if ufunc in VALUE_UFUNCS:  # flags, comparisons and roundings only see the values
+            return ufunc(*(x.value if isinstance(x, Dual) else x for x in inputs), **kwargs)
+
+        if ufunc in UNARY_UFUNCS:
+            x = inputs[0]
+            return x.chain(*UNARY_UFUNCS[ufunc](x.value))
+
+        (a, b) = inputs
+        if ufunc is np.add:
+            return a.plus(b) if isinstance(a, Dual) and isinstance(b, Dual) else \
+                a.shift(b) if isinstance(a, Dual) else b.shift(a)
+        if ufunc is np.subtract:
+            return np.add(a, np.negative(b))
+        if ufunc is np.multiply:
+            return a.times(b) if isinstance(a, Dual) and isinstance(b, Dual) else \
+                a.scale(b) if isinstance(a, Dual) else b.scale(a)
+        if ufunc is np.divide:
+            return a.scale(1 / np.asarray(b, dtype=float)) if not isinstance(b, Dual) else \
+                np.multiply(a, b.reciprocal())
+        if ufunc is np.power:
+            return a.power(b) if isinstance(a, Dual) else np.exp(b * np.log(a))
+        if ufunc in (np.maximum, np.minimum):
+            (x, y) = (a.value if isinstance(a, Dual) else a, b.value if isinstance(b, Dual) else b)
+            return np.where(x >= y if ufunc is np.maximum else x <= y, a, b)
+        return NotImplemented
+
+    def __array_function__(self, func, types, args, kwargs):
+        handler = ARRAY_FUNCTIONS.get(func)
+        return NotImplemented if handler is None else handler(*args, **kwargs)
+
+    # ------------ operators -----------------
+    __add__ = lambda self, other: np.add(self, other)
+    __radd__ = lambda self, other: np.add(other, self)
+    __sub__ = lambda self, other: np.subtract(self, other)
+    __rsub__ = lambda self, other: np.subtract(other, self)
+    __mul__ = lambda self, other: np.multiply(self, other)
+    __rmul__ = lambda self, other: np.multiply(other, self)
+    __truediv__ = lambda self, other: np.divide(self, other)
+    __rtruediv__ = lambda self, other: np.divide(other, self)
+    __pow__ = lambda self, other: np.power(self, other)
+    __rpow__ = lambda self, other: np.power(other, self)
+    __neg__ = lambda self: np.negative(self)
+    __abs__ = lambda self: np.absolute(self)
+    __lt__ = lambda self, other: np.less(self, other)
+    __le__ = lambda self, other: np.less_equal(self, other)
+    __gt__ = lambda self, other: np.greater(self, other)
+    __ge__ = lambda self, other: np.greater_equal(self, other)
+
+
+# (f, f', f'') at x of the elementwise functions used by the closed-form pricers
+UNARY_UFUNCS = {
+    np.negative: lambda x: (-x, -1.0, 0.0),
+    np.exp: lambda x: (np.exp(x),) * 3,
+    np.log: lambda x: (np.log(x), 1 / x, -1 / x ** 2),
+    np.sqrt: lambda x: (np.sqrt(x), 0.5 / np.sqrt(x), -0.25 / (x * np.sqrt(x))),
+    np.square: lambda x: (x * x, 2 * x, 2.0),
+    np.absolute: lambda x: (np.abs(x), np.sign(x), 0.0),
+    ndtr: lambda x: (ndtr(x), npdf(x), -x * npdf(x)),
+}
+
+VALUE_UFUNCS = {
+    np.less, np.less_equal, np.greater, np.greater_equal, np.equal, np.not_equal, np.logical_and, np.logical_or,
+    np.logical_not, np.isnan, np.isfinite, np.isinf, np.sign, np.floor, np.ceil,
+}
+
+
+def as_dual(x, like: Dual) -> Dual:
+    return x if isinstance(x, Dual) else Dual.constant(x, like)
+
+
+def dual_where(condition, x, y=None):
+    like = x if isinstance(x, Dual) else y
+    (x, y) = (as_dual(x, like), as_dual(y, like))
+    ndim = max(np.ndim(condition), x.ndim, y.ndim)
+    return like.new(np.where(condition, x.lift(ndim).d, y.lift(ndim).d))
+
+
+def dual_broadcast_arrays(*args, subok=False):
+    shape = np.broadcast_shapes(*(np.shape(a) for a in args))
+    return tuple(a.new(np.broadcast_to(a.lift(len(shape)).d, a.d.shape[:1] + shape)) if isinstance(a, Dual)
+                 else np.broadcast_to(a, shape) for a in args)
+
+
+def dual_stack(arrays, axis=0):
+    like = next(a for a in arrays if isinstance(a, Dual))
+    return like.new(np.stack([as_dual(a, like).d for a in arrays], axis=axis + 1 if axis >= 0 else axis))
+
+
+def dual_sum(a, axis=None):
+    axis = tuple(range(1, a.d.ndim)) if axis is None else axis + 1 if axis >= 0 else axis
+    return a.new(np.sum(a.d, axis=axis))
+
+
+def dual_bincount(x, weights=None, minlength=0):
+    return weights.new(np.stack([np.bincount(x, weights=w, minlength=minlength) for w in weights.d]))
+
+
+ARRAY_FUNCTIONS = {
+    np.where: dual_where,
+    np.broadcast_arrays: dual_broadcast_arrays,
+    np.stack: dual_stack,
+    np.sum: dual_sum,
+    np.bincount: dual_bincount,
+    np.ravel: lambda a: a.ravel(),
+    np.reshape: lambda a, shape: a.reshape(shape),
+    np.shape: lambda a: a.shape,
+    np.ndim: lambda a: a.ndim,
+}
+
+
+class ADGreeks:
+    # greeks of a closed-form pricer from one run on dual numbers seeded in AD_VARIABLES, units of BSGreeks
+
+    def __init__(self, function: callable, parameter: dict):
+        self.func = function
+        self.param = parameter
+
+    @cached_property
+    def result(self) -> Dual:
+        (n, index) = (len(AD_VARIABLES), AD_VARIABLES.index)
+        pairs = (np.array([index(x) for x, _ in AD_PAIRS]), np.array([index(y) for _, y in AD_PAIRS]))
+        seeded = {x: Dual.variable(self.param[x], k, n, pairs) for k, x in enumerate(AD_VARIABLES)}
+        out = self.func(**{**self.param, **seeded})
+        return as_dual(out, seeded["S"])
+
+    def first(self, x: str):
+        return self.result.grad[AD_VARIABLES.index(x)][()]
+
+    def second(self, x: str, y: str):
+        pair = (x, y) if (x, y) in AD_PAIRS else (y, x)
+        return self.result.hess[AD_PAIRS.index(pair)][()]
+
+    @property
+    def price(self):
+        return self.result.value[()]
+
+    @property
+    def delta(self):
+        return self.first("S")
+
+    @property
+    def gamma(self):
+        return self.second("S", "S")
+
+    @property
+    def vega(self):
+        return self.first("sigma") / 100
+
+    @property
+    def theta(self):
+        return -self.first("T") * ONE_DAY
+
+    @property
+    def rho(self):
+        return self.first("r") / 100
+
+    @property
+    def volga(self):
+        return self.second("sigma", "sigma") / 100 ** 2
+
+    @property
+    def vanna(self):
+        return self.second("S", "sigma") / 100
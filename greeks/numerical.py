@@ -1,6 +1,8 @@
+from functools import cached_property
+
 import numpy as np
-from utils.configs import GREEK_CONFIG
-from utils.difference_utils import fod, sod
+from utils.configs import FD_GREEK_CONFIG, GREEK_CONFIG
+from utils.difference_utils import fod, sod, somd, tod, tomd
 from utils.shock_utils import get_shock, scheme2weight, get_scaling_factor
 
 
@@ -13,183 +15,381 @@ def get_index(param: dict, dS: float) -> tuple[np.ndarray, np.ndarray]:
     for chkpt in checkpoints:
         if chkpt in param.keys():
             C = param[chkpt]
-            iL = np.where((np.abs(C - S0) <= dS) & (S0 <= C))[0]
-            iR = np.where((np.abs(S0 - C) <= dS) & (S0 >= C))[0]
+            iL = np.where(np.atleast_1d((np.abs(C - S0) <= dS) & (S0 <= C)))[0]
+            iR = np.where(np.atleast_1d((np.abs(S0 - C) <= dS) & (S0 >= C)))[0]
             i_left = np.concatenate((i_left, iL))
             i_right = np.concatenate((i_right, iR))
 
     return i_left.astype(int), i_right.astype(int)
 
 
+def trade_shape(param: dict) -> tuple:
+    # broadcast shape of the trades, the legs of a (lower, upper) pair (rebates, pay modes) broadcast on their own
+    leaves = [e for v in param.values() for e in (v if isinstance(v, (list, tuple)) else [v])]
+    return np.broadcast_shapes(*(np.shape(e) for e in leaves))
+
+
+def bump_key(bump: dict, param: dict) -> tuple:
+    # hashable key of the entries of bump that move off param
+    def key(v):
+        if not isinstance(v, (np.ndarray, list)):  # scalars hash as they are
+            return v
+        a = np.asarray(v)
+        return (a.dtype.str, a.shape, a.tobytes())
+    return tuple((k, key(v)) for k, v in sorted(bump.items()) if not np.array_equal(v, param[k]))
+
+
 class FDGreeks:
 
-    def __init__(self, function: callable, parameter: dict):
+    def __init__(self, function: callable, parameter: dict, complex_safe: bool = False):
         self.func = function
         self.param = parameter
         self.param_original = parameter.copy()
+        self.complex_safe = complex_safe  # pricer analytic in its real inputs, complex-step greeks apply
+        self.cache = {}  # pricer value per bump of self.param, shared by all greeks of the instance
+        self.pending = None  # bumps collected by the dry pass of stack()
 
     def reset_param(self):
         self.param = self.param_original
-
-    @property
-    def delta(self):
-        func, param = self.func, self.param.copy()
-        setting = GREEK_CONFIG["delta"]
-        S0 = param["S"]
+        self.cache = {}
+
+    def value(self, **bump):
+        # price at self.param with the bumped entries replaced, each distinct bump priced once
+        key = bump_key(bump, self.param)
+        if self.pending is not None:  # dry pass of stack(): record the bump only
+            self.pending.setdefault(key, bump)
+            return 0.0
+        if key not in self.cache:
+            self.cache[key] = self.func(**{**self.param, **bump})
+        return self.cache[key]
+
+    def stack(self, selected: list[str]):
+        # price the bumps of all selected greeks in one pricer call, stacked on a leading axis, into the cache
+        self.pending = {}
+        try:
+            for greek in selected:
+                getattr(self, greek.lower())
+        finally:
+            bumps, self.pending = self.pending, None
+        todo = [(key, bump) for key, bump in bumps.items() if key not in self.cache]
+        shape = trade_shape(self.param)
+        if len(todo) * np.prod(shape) > FD_GREEK_CONFIG["max_rows"]:  # large books: bump by bump
+            return
+
+        # complex steps go in a call of their own, the real bumps stay real
+        stepped = [any(np.iscomplexobj(v) for v in bump.values()) for _, bump in todo]
+        for group in ([b for b, c in zip(todo, stepped) if not c], [b for b, c in zip(todo, stepped) if c]):
+            if group:
+                self.price_stacked(group, shape)
+
+    def price_stacked(self, todo: list, shape: tuple):
+        tile = lambda values: np.stack([np.broadcast_to(v, shape) for v in values]).reshape(-1)
+        stacked = dict(self.param)
+        for name, v in self.param.items():
+            if isinstance(v, (list, tuple)):  # (lower, upper) pair, tiled leg by leg
+                stacked[name] = type(v)(tile([e] * len(todo)) if np.ndim(e) else e for e in v)
+            elif np.ndim(v) or any(name in bump for _, bump in todo):
+                stacked[name] = tile([bump.get(name, v) for _, bump in todo])
+
+        out = np.reshape(self.func(**stacked), (len(todo),) + shape)
+        for (key, _), v in zip(todo, out):
+            self.cache[key] = v[()]
+
+    def complex_step(self, name: str, setting: dict, **bump):
+        # Im V(x + i h) / h, None when the greek bumps or the pricer is not complex-safe
+        step = setting.get("complex_step")
+        if not step or not self.complex_safe:
+            return None
+        x0 = bump.get(name, self.param[name])
+        h = step * np.maximum(1.0, np.abs(x0))
+        return np.imag(self.value(**{**bump, name: np.asarray(x0 + 1j * h)[()]})) / h
+
+    def spot_weights(self, setting: dict, order: int) -> tuple:
+        # spot stencil offsets (in units of dS), one-sided on the side of spot next to a barrier
+        S0 = self.param["S"]
         dS = get_shock(S0, setting)
+        w = np.tile(np.array(scheme2weight(setting["shock_mode"], order), dtype=float), (np.size(S0), 1))
 
-        w = scheme2weight(setting["shock_mode"], order=1)
-        w = np.tile(w, (len(S0), 1)) if not np.isscalar(S0) else w  # copy w len(S0) times
-
-        i_left, i_right = get_index(param, dS)
+        i_left, i_right = get_index(self.param, dS)
+        w[i_left, :] = scheme2weight("backward", order)
+        w[i_right, :] = scheme2weight("forward", order)
 
-        if np.isscalar(S0):  # S0 is a scalar
-            # use backward difference scheme if spot is at LHS of barrier, w = [0,-1]
-            # use forward difference is spot is at RHS of barrier, w = [1,0]
-            w = [0, -1] if len(i_left) != 0 else [1, 0] if len(i_right) != 0 else w
+        return (w[0] if np.ndim(S0) == 0 else w), dS
 
-            param["S"] = S0 + w[0] * dS
-            V0 = func(**param)
-            param["S"] = S0 + w[1] * dS
-            V1 = func(**param)
-            delta = fod(V0, V1, (w[0] - w[1]) * dS)
+    def spot_values(self, setting: dict, order: int, **bump) -> tuple:
+        # prices on the spot stencil with the entries of bump replaced, its offsets and the spot shock
+        (w, dS) = self.spot_weights(setting, order)
+        S0 = self.param["S"]
+        return [self.value(**bump, S=S0 + w[..., k] * dS) for k in range(order + 1)], w, dS
 
-        else:  # S0 is an array
-            # use backward difference scheme if spot is at LHS of barrier, update i_left row of w with [0,-1]
-            # use forward difference is spot is at RHS of barrier, update i_right row of w with [1,0]
-            if len(i_left) != 0:
-                w[i_left, :] = [0, -1]
-            if len(i_right) != 0:
-                w[i_right, :] = [1, 0]
+    def levels(self, name: str, setting: dict) -> tuple:
+        # the two bumped values of a first-order difference in param[name] and half their spacing
+        x0 = self.param[name]
+        dx = get_shock(x0, setting)
+        w = scheme2weight(setting["shock_mode"], order=1)
+        x = [x0 + w[0] * dx, x0 + w[1] * dx]
+        if name == "T":
+            x = [np.maximum(t, 1e-5)[()] for t in x]
+        return x, (x[0] - x[1]) / 2
+
+    def adaptive(self, name: str, setting: dict) -> tuple:
+        # first and second derivative in param[name], Richardson extrapolation over halved steps per trade
+        (budget, tol) = (FD_GREEK_CONFIG["budget"], FD_GREEK_CONFIG["tol"])
+        x0 = self.param[name]
+        h = np.array(np.broadcast_to(get_shock(x0, setting), trade_shape(self.param)), dtype=float)
+        if name == "S":
+            for level in ("L", "Ll", "Lh"):
+                if level in self.param:
+                    gap = np.abs(self.param[level] - x0)
+                    h = np.where(gap > 0, np.minimum(h, gap / 2), h)
+
+        V0 = self.value()
+        (done, out, prev, prev_rich) = (np.zeros(h.shape, dtype=bool), None, None, None)
+        for _ in range((budget - 1) // 2):  # the centre and two evaluations per step
+            (Vu, Vd) = (self.value(**{name: x0 + h}), self.value(**{name: x0 - h}))
+            est = np.array([fod(Vu, Vd, 2 * h), sod(Vu, V0, Vd, h)])
+            rich = est if prev is None else (4 * est - prev) / 3
+            out = rich if out is None else np.where(done, out, rich)
+            if prev_rich is not None:
+                done |= np.all(np.abs(rich - prev_rich) <= tol * (1 + np.abs(rich)), axis=0)
+            if np.all(done):
+                break
+            (h, prev, prev_rich) = (np.where(done, h, h / 2), est, rich)
+
+        return out[0][()], out[1][()]
+
+    def spot_delta(self, **bump):
+        # delta at the parameters with the bumped entries replaced (vanna bumps sigma)
+        setting = GREEK_CONFIG["delta"]
+        delta = self.complex_step("S", setting, **bump)
+        if delta is not None:
+            return delta
+        if FD_GREEK_CONFIG["adaptive"] and not bump:
+            return self.adaptive("S", setting)[0]
 
-            param["S"] = S0 + w[:, 0] * dS
-            V0 = func(**param)
-            param["S"] = S0 + w[:, 1] * dS
-            V1 = func(**param)
-            delta = fod(V0, V1, (w[:, 0] - w[:, 1]) * dS)
+        (V, w, dS) = self.spot_values(setting, 1, **bump)
+        return fod(V[0], V[1], (w[..., 0] - w[..., 1]) * dS)
 
-        return delta
+    @property
+    def delta(self):
+        return self.spot_delta()
 
     @property
     def gamma(self):
-        func, param = self.func, self.param.copy()
-        setting = GREEK_CONFIG["gamma"]
-        S0 = param["S"]
-        dS = get_shock(S0, setting)
+        if FD_GREEK_CONFIG["adaptive"]:
+            return self.adaptive("S", GREEK_CONFIG["gamma"])[1]
+        (V, w, dS) = self.spot_values(GREEK_CONFIG["gamma"], 2)
+        return sod(V[0], V[1], V[2], (w[..., 0] - w[..., 1]) * dS)
 
-        w = scheme2weight(setting["shock_mode"], order=2)
-        w = np.tile(w, (len(S0), 1)) if not np.isscalar(S0) else w  # copy w len(S0) times
+    @property
+    def speed(self):
+        (V, w, dS) = self.spot_values(GREEK_CONFIG["speed"], 3)
+        return tod(V[0], V[1], V[2], V[3], (w[..., 0] - w[..., 1]) * dS)
 
-        i_left, i_right = get_index(param, dS)
+    # cross greeks: the stencil of the lower greek at the two bumped levels of their second parameter
+    @property
+    def zomma(self):
+        setting = GREEK_CONFIG["zomma"]
+        (v, b) = self.levels("sigma", setting)
+        (Vu, w, dS) = self.spot_values(GREEK_CONFIG["gamma"], 2, sigma=v[0])
+        (Vd, _, _) = self.spot_values(GREEK_CONFIG["gamma"], 2, sigma=v[1])
 
-        if np.isscalar(S0):  # S0 is a scalar
-            # use backward difference scheme if spot is at LHS of barrier, w = [0,-1]
-            # use forward difference is spot is at RHS of barrier, w = [1,0]
-            w = [0, -1, -2] if len(i_left) != 0 else [2, 1, 0] if len(i_right) != 0 else w
+        dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
+        return tomd(Vu[0], Vu[1], Vu[2], Vd[0], Vd[1], Vd[2], (w[..., 0] - w[..., 1]) * dS, b) * dvol
 
-            param["S"] = S0 + w[0] * dS
-            V0 = func(**param)
-            param["S"] = S0 + w[1] * dS
-            V1 = func(**param)
-            param["S"] = S0 + w[2] * dS
-            V2 = func(**param)
+    @property
+    def color(self):
+        setting = GREEK_CONFIG["color"]
+        (T, b) = self.levels("T", setting)
+        (Vu, w, dS) = self.spot_values(GREEK_CONFIG["gamma"], 2, T=T[0])
+        (Vd, _, _) = self.spot_values(GREEK_CONFIG["gamma"], 2, T=T[1])
 
-            gamma = sod(V0, V1, V2, (w[0] - w[1]) * dS)
+        dT = get_shock(self.param["T"], setting)
+        return -tomd(Vu[0], Vu[1], Vu[2], Vd[0], Vd[1], Vd[2], (w[..., 0] - w[..., 1]) * dS, b) * dT
 
-        else:  # S0 is an array
-            # use backward difference scheme if spot is at LHS of barrier, update i_left row of w with [0,-1,-2]
-            # use forward difference is spot is at RHS of barrier, update i_right row of w with [2,1,0]
-            if len(i_left) != 0:
-                w[i_left, :] = np.array([0, -1, -2])
-            if len(i_right) != 0:
-                w[i_right, :] = np.array([2, 1, 0])
+    @property
+    def charm(self):
+        setting = GREEK_CONFIG["charm"]
+        (T, b) = self.levels("T", setting)
+        (Vu, w, dS) = self.spot_values(GREEK_CONFIG["delta"], 1, T=T[0])
+        (Vd, _, _) = self.spot_values(GREEK_CONFIG["delta"], 1, T=T[1])
 
-            param["S"] = S0 + w[:, 0] * dS
-            V0 = func(**param)
-            param["S"] = S0 + w[:, 1] * dS
-            V1 = func(**param)
-            param["S"] = S0 + w[:, 2] * dS
-            V2 = func(**param)
-            gamma = sod(V0, V1, V2, (w[:, 0] - w[:, 1]) * dS)
+        dT = get_shock(self.param["T"], setting)
+        return -somd(Vu[0], Vd[0], Vu[1], Vd[1], (w[..., 0] - w[..., 1]) * dS / 2, b) * dT
 
-        return gamma
+    @property
+    def veta(self):
+        setting, vega_setting = GREEK_CONFIG["veta"], GREEK_CONFIG["vega"]
+        (T, b) = self.levels("T", setting)
+        (v, a) = self.levels("sigma", vega_setting)
+        (V11, V1_1) = (self.value(sigma=v[0], T=T[0]), self.value(sigma=v[0], T=T[1]))
+        (V_11, V_1_1) = (self.value(sigma=v[1], T=T[0]), self.value(sigma=v[1], T=T[1]))
+
+        dT = get_shock(self.param["T"], setting)
+        dvol = vega_setting["shock_magnitude"] * \
+            get_scaling_factor(vega_setting["shock_type"], vega_setting["shock_unit"])
+        return -somd(V11, V1_1, V_11, V_1_1, a, b) * dvol * dT
 
     @property
     def vega(self):
-        func, param = self.func, self.param.copy()
         setting = GREEK_CONFIG["vega"]
-        v0 = param["sigma"]
+        dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
+        vega = self.complex_step("sigma", setting)
+        if vega is not None:
+            return vega * dvol
+        if FD_GREEK_CONFIG["adaptive"]:
+            return self.adaptive("sigma", setting)[0] * dvol
+
+        v0 = self.param["sigma"]
         dv = get_shock(v0, setting)
         w = scheme2weight(setting["shock_mode"], order=1)
 
-        param["sigma"] = v0 + w[0] * dv
-        V0 = func(**param)
-        param["sigma"] = v0 + w[1] * dv
-        V1 = func(**param)
+        V0 = self.value(sigma=v0 + w[0] * dv)
+        V1 = self.value(sigma=v0 + w[1] * dv)
 
-        dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
         return fod(V0, V1, (w[0] - w[1]) * dv) * dvol
 
     @property
     def theta(self):
-        func, param = self.func, self.param.copy()
         setting = GREEK_CONFIG["theta"]
-        T = param["T"]
+        T = self.param["T"]
         dT = get_shock(T, setting)
 
-        V0 = func(**param)
-        param["T"] = 1e-5 if T <= dT else T - dT
-        V1 = func(**param)
+        V0 = self.value()
+        V1 = self.value(T=np.where(T <= dT, 1e-5, T - dT)[()])
 
         return -(V0 - V1)
 
     @property
     def rho(self):
-        func, param = self.func, self.param.copy()
         setting = GREEK_CONFIG["rho"]
-        r0 = param["r"]
+        dIR = 0.01
+        rho = self.complex_step("r", setting)
+        if rho is not None:
+            return rho * dIR
+
+        r0 = self.param["r"]
         dr = get_shock(r0, setting)
         w = scheme2weight(setting["shock_mode"], order=1)
 
-        param["r"] = r0 + w[0] * dr
-        V0 = func(**param)
-        param["r"] = r0 + w[1] * dr
-        V1 = func(**param)
+        V0 = self.value(r=r0 + w[0] * dr)
+        V1 = self.value(r=r0 + w[1] * dr)
 
-        dIR = 0.01
         return fod(V0, V1, (w[0] - w[1]) * dr) * dIR
 
     @property
     def volga(self):
-        func, param = self.func, self.param.copy()
         setting = GREEK_CONFIG["volga"]
+        dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
+        if FD_GREEK_CONFIG["adaptive"]:
+            return self.adaptive("sigma", setting)[1] * dvol ** 2
+
+        v0 = self.param["sigma"]
+        dv = get_shock(v0, setting)
+        w = scheme2weight(setting["shock_mode"], order=2)
+
+        V0 = self.value(sigma=v0 + w[0] * dv)
+        V1 = self.value(sigma=v0 + w[1] * dv)
+        V2 = self.value(sigma=v0 + w[2] * dv)
+
+        return sod(V0, V1, V2, (w[0] - w[1]) * dv) * dvol ** 2
+
+    @property
+    def vanna(self):
+        setting = GREEK_CONFIG["vanna"]
+        v0 = self.param["sigma"]
+        dv = get_shock(v0, setting)
+        w = scheme2weight(setting["shock_mode"], order=2)
+
+        D0 = self.spot_delta(sigma=v0 + w[0] * dv)
+        D1 = self.spot_delta(sigma=v0 + w[1] * dv)
+
+        dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
+
+        return fod(D0, D1, (w[0] - w[1]) * dv) * dvol
+
+
+class MCGreeks(FDGreeks):
+    # greeks of a Monte Carlo pricer from the paths of its own price (return_greeks=True)
+
+    @cached_property
+    def estimates(self) -> dict:
+        return self.func(**self.param, return_greeks=True)
+
+    @property
+    def delta(self):
+        return self.estimates["delta"]
+
+    @property
+    def gamma(self):
+        return self.estimates["gamma"]
+
+    @property
+    def vega(self):
+        return self.estimates["vega"]
+
+    @property
+    def theta(self):
+        return self.estimates["theta"]
+
+    @property
+    def rho(self):
+        return self.estimates["rho"]
+
+    @property
+    def vanna(self):
+        func, param = self.func, self.param.copy()
+        setting = GREEK_CONFIG["vanna"]
         v0 = param["sigma"]
         dv = get_shock(v0, setting)
         w = scheme2weight(setting["shock_mode"], order=2)
 
         param["sigma"] = v0 + w[0] * dv
-        V0 = func(**param)
+        D0 = func(**param, return_greeks=True)["delta"]
         param["sigma"] = v0 + w[1] * dv
-        V1 = func(**param)
-        param["sigma"] = v0 + w[2] * dv
-        V2 = func(**param)
+        D1 = func(**param, return_greeks=True)["delta"]
 
         dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
 
-        return sod(V0, V1, V2, (w[0] - w[1]) * dv) * dvol ** 2
+        return fod(D0, D1, (w[0] - w[1]) * dv) * dvol
+
+
+class GridGreeks(FDGreeks):
+    # greeks of a PDE pricer off the grid of its own solve (return_grid=True), FDGreeks when trades differ beyond spot
+
+    @cached_property
+    def grid(self):
+        try:
+            return self.func(**self.param, return_grid=True)
+        except ValueError:
+            return None
+
+    @property
+    def delta(self):
+        return super().delta if self.grid is None else self.grid.delta(self.param["S"])
+
+    @property
+    def gamma(self):
+        return super().gamma if self.grid is None else self.grid.gamma(self.param["S"])
+
+    @property
+    def theta(self):
+        return super().theta if self.grid is None else self.grid.theta(self.param["S"])
 
     @property
     def vanna(self):
+        if self.grid is None:
+            return super().vanna
         func, param = self.func, self.param.copy()
         setting = GREEK_CONFIG["vanna"]
         v0 = param["sigma"]
         dv = get_shock(v0, setting)
         w = scheme2weight(setting["shock_mode"], order=2)
 
-        self.param["sigma"] = v0 + w[0] * dv
-        D0 = self.delta
-        self.param["sigma"] = v0 + w[1] * dv
-        D1 = self.delta
+        param["sigma"] = v0 + w[0] * dv
+        D0 = func(**param, return_grid=True).delta(param["S"])
+        param["sigma"] = v0 + w[1] * dv
+        D1 = func(**param, return_grid=True).delta(param["S"])
 
         dvol = setting["shock_magnitude"] * get_scaling_factor(setting["shock_type"], setting["shock_unit"])
 
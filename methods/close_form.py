@@ -1,152 +1,189 @@
 import numpy as np
-from scipy.stats import norm
+from functools import lru_cache
 from typing import Union
 
-from utils.flag_utils import cp2omega, get_touch_flag, get_barrier_flag
+from utils.configs import IMAGE_SERIES_CONFIG, HESTON_QUAD_CONFIG
+from utils.flag_utils import cp2omega, get_touch_flag, get_double_touch_flag, get_barrier_flag, get_double_barrier_flag
+from utils.normal_utils import ncdf, ncdf_pair
+
+# pricers and payoffs take scalars or broadcastable arrays, option-type codes included
+Numeric = Union[float, np.ndarray]
+
+
+def split_pair(x: Union[Numeric, list, tuple]) -> tuple:
+    # (lower, upper) legs of a double barrier rebate / pay mode, a list or tuple is a pair, anything else is shared
+    return (x[0], x[1]) if isinstance(x, (list, tuple)) else (x, x)
+
+
+def trade_rows(trade: dict) -> tuple:
+    # broadcast shape of a batch and the scalar trade at every index, lists / tuples stay (lower, upper) pairs
+    leaves = [e for v in trade.values() for e in (v if isinstance(v, (list, tuple)) else [v])]
+    shape = np.broadcast_shapes(*[np.shape(e) for e in leaves])
+    at = lambda v, idx: np.broadcast_to(np.asarray(v, dtype=object if np.ndim(v) == 0 else None), shape)[idx]
+    rows = [(idx, {k: type(v)(at(e, idx) for e in v) if isinstance(v, (list, tuple)) else at(v, idx)
+                   for k, v in trade.items()}) for idx in np.ndindex(shape)]
+    return shape, rows
 
 
 def european_option_payoff(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float
-) -> float:
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric
+) -> Numeric:
     omega = cp2omega(option_type)
     return np.maximum(omega * (S - K), 0.0)
 
 
-def european_option_bs_cf(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float
-) -> float:
-    omega = cp2omega(option_type)
+def european_value(
+    omega: Numeric, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric
+) -> Numeric:
+    # Calls and puts go through one pass: shared discount and forward, one fused cdf call for (d1, d2)
     discount = np.exp(-r * T)
     forward = S * np.exp((r - q) * T)
-    moneyness = np.log(forward / K)
     vol_sqrt_time = sigma * np.sqrt(T)
 
-    d1 = moneyness / vol_sqrt_time + 0.5 * vol_sqrt_time
-    d2 = d1 - vol_sqrt_time
+    d1 = np.log(forward / K) / vol_sqrt_time + 0.5 * vol_sqrt_time
+    nd1, nd2 = ncdf_pair(omega, d1, d1 - vol_sqrt_time)
+
+    return omega * discount * (forward * nd1 - K * nd2)
+
 
-    return omega * discount * (forward * norm.cdf(omega * d1) - K * norm.cdf(omega * d2))
+def european_option_bs_cf(
+    option_type: Union[str, np.ndarray], S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric
+) -> Numeric:
+    # option_type may be a code ("call" / "p"), an array of codes, or an omega / boolean array (call = 1 / True)
+    omega = cp2omega(option_type)
+    return european_value(omega, S, K, T, r, q, sigma)
 
 
 def single_touch_option_payoff(
-    option_type: str, S: float, T: float, r: float, q: float, sigma: float, L: float, rbt: float = 1.0, PaE: bool = True
-) -> float:
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True
+) -> Numeric:
     is_down, touch = get_touch_flag(option_type)
     hit = (is_down * (S - L) <= 0)
-    payoff = rbt * hit if touch else rbt * (1 - hit)
-    return payoff
+    payoff = rbt * np.where(touch, hit, np.logical_not(hit))
+    return np.asarray(payoff)[()]
 
 
 def single_touch_option_bs_cf(
-    option_type: str, S: float, T: float, r: float, q: float, sigma: float, L: float, rbt: float = 1.0, PaE: bool = True
-) -> float:
-    if rbt == 0.0:
-        return 0.0
-
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True
+) -> Numeric:
     eta, touch = get_touch_flag(option_type)
 
     mu, v = (r - q) / sigma ** 2 - 0.5, sigma * np.sqrt(T)
     lbd = np.sqrt(mu ** 2 + 2 * np.maximum(0, r) / sigma ** 2)
     dfr = np.exp(-r * T)
 
-    if touch:  # For touch option, get rebate when hitting barrier, can be PaE oe PaH
-
-        if PaE:
-            z = np.log(L / S) / v + mu * v
-            val = rbt * dfr * ((L / S) ** (2 * mu) * norm.cdf(eta * z) + norm.cdf(eta * (z - 2 * mu * v)))
-        else:
-            z = np.log(L / S) / v + lbd * v
-            val = rbt * ((L / S) ** (mu + lbd) * norm.cdf(eta * z) + (L / S) ** (mu - lbd) * norm.cdf(
-                eta * (z - 2 * lbd * v)))
-
-    else:  # For no-touch option, get rebate when not hitting barrier, must be PaE
-        (x, y) = (np.log(S / L) / v + (1 + mu) * v, np.log(L / S) / v + (1 + mu) * v)
-        val = rbt * dfr * (norm.cdf(eta * (x - v)) - (L / S) ** (2 * mu) * norm.cdf(eta * (y - v)))
+    # For touch option, get rebate when hitting barrier, can be PaE or PaH. No-touch (must be PaE) is dfr - PaE touch
+    pah = np.logical_and(touch, np.logical_not(PaE))
+    lam = np.where(pah, lbd, mu)
+    z = np.log(L / S) / v + lam * v
+    val = np.where(pah, 1.0, dfr) * ((L / S) ** (mu + lam) * ncdf(eta * z) +
+                                     (L / S) ** (mu - lam) * ncdf(eta * (z - 2 * lam * v)))
+    val = rbt * np.where(touch, val, dfr - val)
 
     # SPECIAL HANDLING: when spot hits barrier at t = 0
     hit = eta * (S - L) <= 0
+    val = np.where(hit, touch * rbt * np.exp(-r * PaE * T), val)
 
-    if hit:
-        val = rbt * np.exp(-r * PaE * T) if touch else 0
-
-    return val
+    return np.asarray(val)[()]
 
 
 def val_rbt(R, PaE, T, mu_hat, mu_prime, sigma, xl, xh, du_flag, x, DFr):
-    if PaE:
-        return R * DFr * G(T, mu_hat, sigma, xl, xh, du_flag, x)
-    else:
-        return R * np.exp((mu_hat - mu_prime) * x / sigma ** 2) * G(T, mu_prime, sigma, xl, xh, du_flag, x)
+    # PaE discounts the hitting probability under mu_hat, PaH folds the discounting into the drift mu_prime
+    mu = np.where(PaE, mu_hat, mu_prime)
+    scale = np.where(PaE, DFr, np.exp((mu_hat - mu_prime) * x / sigma ** 2))
+    return R * scale * G(T, mu, sigma, xl, xh, du_flag, x)
+
+
+def image_counts(v, c, m, d, w, x, setting):
+    # number of images on each side (k >= 0, k < 0) of u_k = d + 2 * k * w with terms above tol
+    if setting["truncation"] == "fixed":
+        n = setting["fixed_terms"]
+        return np.full(d.shape, n), np.full(d.shape, n)
+
+    (tol, n_max) = (setting["tol"], setting["max_terms"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u_min = np.sqrt(np.maximum(0.0, 2 * v ** 2 * (c * x - np.log(tol)) - m ** 2))
+        u_min = np.maximum(u_min, np.abs(m) + v)
+        (n_pos, n_neg) = (np.ceil((u_min - d) / (2 * w)), np.ceil((u_min + d) / (2 * w)))
+
+    n_pos = np.clip(np.nan_to_num(n_pos, nan=n_max, posinf=n_max, neginf=0), 0, n_max).astype(int)
+    n_neg = np.clip(np.nan_to_num(n_neg, nan=n_max, posinf=n_max, neginf=1), 1, n_max).astype(int)
+    return n_pos, n_neg
+
+
+def ragged_images(n_pos, n_neg):
+    # Ragged batch: row i takes the images k = -n_neg[i], ..., n_pos[i], all rows flattened into one vector
+    n = n_pos + n_neg + 1
+    row = np.repeat(np.arange(n.size), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) - n_neg[row]
+    return row, k
 
 
 def G(t, mu, sigma, xl, xh, du_flag, x):
-    (k1, k2) = (np.arange(0, 7), np.arange(-6, 0))
-    # (k1, k2) = (np.arange(0,30), np.arange(-29,0))
+    (v, c, m, w, x) = np.broadcast_arrays(sigma * np.sqrt(t), mu / sigma ** 2, mu * t, xh - xl, x)
+    shape = x.shape
+    (v, c, m, w, x) = (np.ravel(a) for a in (v, c, m, w, x))
+    (n_pos, n_neg) = image_counts(v, c, m, du_flag * x, w, x, IMAGE_SERIES_CONFIG)
+    scale = np.exp(c * x)
 
-    if np.isscalar(x):
-        (u1, u2) = (du_flag * x + 2 * k1 * (xh - xl), du_flag * x + 2 * k2 * (xh - xl))
-    else:
-        (u1, u2) = (du_flag * x + 2 * np.outer(k1, xh - xl), du_flag * x + 2 * np.outer(k2, xh - xl))
+    (row, k) = ragged_images(n_pos, n_neg)
+    (v, c, m, w, x) = (v[row], c[row], m[row], w[row], x[row])
 
-    (v, c) = (sigma * np.sqrt(t), mu / sigma ** 2)
-    (e1, e2) = (np.exp(c * u1), np.exp(c * u2))
-    PI1 = norm.cdf((-u1 - mu * t) / v) * e1 + norm.cdf((-u1 + mu * t) / v) / e1
-    PI2 = norm.cdf((u2 + mu * t) / v) * e2 + norm.cdf((u2 - mu * t) / v) / e2
+    # Images with k < 0 enter with a minus sign and mirrored u, i.e. PI(u) for k >= 0 and -PI(-u) for k < 0
+    s = np.where(k >= 0, 1, -1)
+    u = s * (du_flag * x + 2 * k * w)
+    e = np.exp(c * u)
+    PI = ncdf((-u - m) / v) * e + ncdf((-u + m) / v) / e
 
-    if np.isscalar(x):
-        return (np.sum(PI1) - np.sum(PI2)) * np.exp(c * x)
-    else:
-        return (np.sum(PI1, axis=0) - np.sum(PI2, axis=0)) * np.exp(c * x)
+    return (np.bincount(row, weights=s * PI, minlength=n_pos.size) * scale).reshape(shape)[()]
 
 
 def double_touch_option_payoff(
-    option_type: str, S: float, T: float, r: float, q: float, sigma: float, Ll: float, Lh: float,
-    rbt: Union[float, list[float]] = 1.0, PaE: Union[bool, list[bool]] = True
-) -> float:
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True
+) -> Numeric:
+    with_l, with_u, no_touch = get_double_touch_flag(option_type)
+    (lR, uR) = split_pair(rbt)
     hit_lb, hit_ub = (S <= Ll), (S >= Lh)
-    payoff = rbt * hit_lb if option_type.upper() == "OTDNTU" \
-        else rbt * hit_ub if option_type.upper() == "OTUNTD" \
-        else rbt[0] * hit_lb + rbt[1] * hit_ub if option_type.upper() == "DOT" \
-        else rbt * (1 - hit_ub - hit_lb)
-    return payoff
+    payoff = np.where(no_touch, lR * np.logical_not(hit_lb | hit_ub), with_l * lR * hit_lb + with_u * uR * hit_ub)
+    return np.asarray(payoff)[()]
 
 
 def double_touch_option_bs_cf(
-    option_type: str, S: float, T: float, r: float, q: float, sigma: float, Ll: float, Lh: float,
-    rbt: Union[float, list[float]] = 1.0, PaE: Union[bool, list[bool]] = True
-) -> float:
-    option_type = option_type.upper()
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True
+) -> Numeric:
+    # OTDNTU uses the lower leg, OTUNTD the upper leg, DOT both, DNT = rbt * dfr - DOT with both legs paid at expiry
+    with_l, with_u, no_touch = get_double_touch_flag(option_type)
+    (lR, uR), (lPaE, uPaE) = split_pair(rbt), split_pair(PaE)
+    (uR, lPaE, uPaE) = (np.where(no_touch, lR, uR), np.logical_or(lPaE, no_touch), np.logical_or(uPaE, no_touch))
+
     dfr = np.exp(-r * T)
     mu_hat = (r - q) - sigma ** 2 / 2
     mu_prime = np.sqrt(mu_hat ** 2 + 2 * r * sigma ** 2)
 
     (xl, xh) = (np.log(Ll / S), np.log(Lh / S))
 
+    val = 0.0
+    if np.any(with_l):
+        val = val + with_l * val_rbt(lR, lPaE, T, mu_hat, mu_prime, sigma, xl, xh, -1, xl, dfr)
+    if np.any(with_u):
+        val = val + with_u * val_rbt(uR, uPaE, T, mu_hat, mu_prime, sigma, xl, xh, 1, xh, dfr)
+    val = np.where(no_touch, lR * dfr - val, val)
+
     # SPECIAL HANDLING: when spot hits barrier at t = 0
     hit_lb, hit_ub = (S <= Ll), (S >= Lh)
+    v_hit = np.where(hit_ub, with_u * uR * np.exp(-r * uPaE * T), with_l * lR * np.exp(-r * lPaE * T))
+    val = np.where(hit_lb | hit_ub, (1 - no_touch) * v_hit, val)
 
-    if option_type == 'OTUNTD':
-        val = rbt * np.exp(-r * PaE * T) if hit_ub else 0 if hit_lb else \
-                val_rbt(rbt, PaE, T, mu_hat, mu_prime, sigma, xl, xh, 1, xh, dfr)
-
-    elif option_type == 'OTDNTU':
-        val = rbt * np.exp(-r * PaE * T) if hit_lb else 0 if hit_ub else \
-                val_rbt(rbt, PaE, T, mu_hat, mu_prime, sigma, xl, xh, -1, xl, dfr)
-
-    elif option_type == 'DOT':
-        otd_ntu = double_touch_option_bs_cf('OTDNTU', S, T, r, q, sigma, Ll, Lh, rbt[0], PaE[0])
-        otu_ntd = double_touch_option_bs_cf('OTUNTD', S, T, r, q, sigma, Ll, Lh, rbt[1], PaE[1])
-        val = otu_ntd + otd_ntu
-
-    else:  # DNT
-        dot = double_touch_option_bs_cf('DOT', S, T, r, q, sigma, Ll, Lh, [rbt, rbt], [True, True])
-        val = rbt * dfr - dot
-
-    return val
+    return np.asarray(val)[()]
 
 
 def get_barrier_para(
-    option_flag: list[int], S: float, K: float, T: float, r: float, b: float, sigma: float, L: float,
-    rbt: float = 1.0, PaE: bool = True
+    option_flag: list, S: Numeric, K: Numeric, T: Numeric, r: Numeric, b: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True
 ) -> tuple:
     (eta, phi) = (option_flag[0], option_flag[2])
     (mu, v) = (b / sigma ** 2 - 0.5, sigma * np.sqrt(T))
@@ -157,43 +194,37 @@ def get_barrier_para(
     (dfr, dfq) = (np.exp(-r * T), np.exp((b - r) * T))
     (M1, M2, LS) = (phi * S * dfq, phi * K * dfr, L / S)
 
-    I1 = M1 * norm.cdf(phi * x1) - M2 * norm.cdf(phi * (x1 - v))
-    I2 = M1 * norm.cdf(phi * x2) - M2 * norm.cdf(phi * (x2 - v))
-    I3 = M1 * LS ** (2 * (mu + 1)) * norm.cdf(eta * y1) - M2 * LS ** (2 * mu) * norm.cdf(eta * (y1 - v))
-    I4 = M1 * LS ** (2 * (mu + 1)) * norm.cdf(eta * y2) - M2 * LS ** (2 * mu) * norm.cdf(eta * (y2 - v))
-
-    if rbt == 0.0:
-        (I5, I6) = (0.0, 0.0)
-    else:
-        I5 = rbt * dfr * (
-                norm.cdf(eta * (x2 - v)) - LS ** (2 * mu) * norm.cdf(eta * (y2 - v)))  # Pay-at-expiry for not KI
-        if PaE:
-            z = np.log(L / S) / v + mu * v
-            I6 = rbt * dfr * (LS ** (2 * mu) * norm.cdf(eta * z) + norm.cdf(eta * (z - 2 * mu * v)))
-        else:
-            z = np.log(L / S) / v + lbd * v
-            I6 = rbt * (LS ** (mu + lbd) * norm.cdf(eta * z) + LS ** (mu - lbd) * norm.cdf(eta * (z - 2 * lbd * v)))
+    I1 = M1 * ncdf(phi * x1) - M2 * ncdf(phi * (x1 - v))
+    I2 = M1 * ncdf(phi * x2) - M2 * ncdf(phi * (x2 - v))
+    I3 = M1 * LS ** (2 * (mu + 1)) * ncdf(eta * y1) - M2 * LS ** (2 * mu) * ncdf(eta * (y1 - v))
+    I4 = M1 * LS ** (2 * (mu + 1)) * ncdf(eta * y2) - M2 * LS ** (2 * mu) * ncdf(eta * (y2 - v))
+
+    I5 = rbt * dfr * (ncdf(eta * (x2 - v)) - LS ** (2 * mu) * ncdf(eta * (y2 - v)))  # Pay-at-expiry for not KI
+
+    # Rebate at hit for KO, PaE is the PaH formula with lbd -> mu discounted by dfr
+    lam = np.where(PaE, mu, lbd)
+    z = np.log(L / S) / v + lam * v
+    I6 = rbt * np.where(PaE, dfr, 1.0) * (LS ** (mu + lam) * ncdf(eta * z) +
+                                          LS ** (mu - lam) * ncdf(eta * (z - 2 * lam * v)))
 
     return I1, I2, I3, I4, I5, I6
 
 
 def single_barrier_option_payoff(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float, L: float,
-    rbt: float = 1.0, PaE: bool = True
-) -> float:
-    is_down, knockout, _ = get_barrier_flag(option_type)
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True
+) -> Numeric:
+    is_down, knockout, omega = get_barrier_flag(option_type)
     hit = is_down * (S - L) <= 0
-    if (knockout & hit) or (~knockout & ~hit):  # Rebate under two cases: 1. knock-out and hit, 2. knock-in and no hit
-        payoff = rbt
-    else:
-        payoff = european_option_payoff(option_type[-1], S, K, T, r, q, sigma)
-    return payoff
+    # Rebate under two cases: 1. knock-out and hit, 2. knock-in and no hit
+    payoff = np.where((knockout == 1) == hit, rbt, np.maximum(omega * (S - K), 0.0))
+    return np.asarray(payoff)[()]
 
 
 def single_barrier_option_bs_cf(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float, L: float,
-    rbt: float = 1.0, PaE: bool = True
-) -> float:
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True
+) -> Numeric:
     option_flag = get_barrier_flag(option_type)
     (I1, I2, I3, I4, I5, I6) = get_barrier_para(option_flag, S, K, T, r, r - q, sigma, L, rbt, PaE)
 
@@ -202,86 +233,176 @@ def single_barrier_option_bs_cf(
 
     dc_and_up = (eta * omega == 1)  # Down Call and Up Put
 
-    if knockout:  # Knock-Out: DOC, UOC, DOP, UOP
-        v_no_hit = (I1 - I3 + I6 if K_L else I2 - I4 + I6) if dc_and_up else (I1 - I2 + I3 - I4 + I6 if K_L else I6)
-        v_hit = rbt * np.exp(-r * T * PaE)
-
-    else:  # Knock-In:  DIC, UIC, DIP, UIP
-        v_no_hit = (I3 + I5 if K_L else I1 - I2 + I4 + I5) if dc_and_up else (I2 - I3 + I4 + I5 if K_L else I1 + I5)
-        v_hit = european_option_bs_cf(option_type[-1], S, K, T, r, q, sigma)
+    # Knock-Out: DOC, UOC, DOP, UOP
+    v_ko = np.where(dc_and_up, np.where(K_L, I1 - I3 + I6, I2 - I4 + I6), np.where(K_L, I1 - I2 + I3 - I4 + I6, I6))
+    # Knock-In:  DIC, UIC, DIP, UIP
+    v_ki = np.where(dc_and_up, np.where(K_L, I3 + I5, I1 - I2 + I4 + I5), np.where(K_L, I2 - I3 + I4 + I5, I1 + I5))
+    val = np.where(knockout == 1, v_ko, v_ki)
 
     # SPECIAL HANDLING: when spot hits barrier at t = 0
-    val = v_hit if hit else v_no_hit
-    return val
+    if np.any(hit):
+        v_euro = european_value(omega, S, K, T, r, q, sigma) if np.any(knockout == -1) else 0.0
+        val = np.where(hit, np.where(knockout == 1, rbt * np.exp(-r * T * PaE), v_euro), val)
 
+    return np.asarray(val)[()]
 
-def f(m, s, xl, xh, nu, z1, z2):
-    k = np.arange(-6, 7)
-    if np.isscalar(xl):
-        (u, a1, a2, c) = (2 * k * (xh - xl), np.maximum(z1, xl), np.minimum(z2, xh), m / s ** 2)
-    else:
-        (u, a1, a2, c) = (2 * np.outer(k, xh - xl), np.maximum(z1, xl), np.minimum(z2, xh), m / s ** 2)
 
-    yvet = np.exp(-c * u) * PHI(a1, a2, -m + u, s, nu) - np.exp(c * (2 * xh - u)) * PHI(a1, a2, -m - 2 * xh + u, s, nu)
-    return np.sum(yvet) if np.isscalar(xl) else np.sum(yvet, axis=0)
+def f(m, s, xl, xh, z1, z2):
+    # (f0, f1): f for nu = 0 and nu = 1 over the shared images u_k = 2 * k * (xh - xl)
+    (m, s, xl, xh, z1, z2) = np.broadcast_arrays(m, s, xl, xh, z1, z2)
+    shape = m.shape
+    (m, s, xl, xh, z1, z2) = (np.ravel(a) for a in (m, s, xl, xh, z1, z2))
+    (a1, c, w) = (np.maximum(z1, xl), m / s ** 2, xh - xl)
+    a2 = np.maximum(np.minimum(z2, xh), a1)  # empty integration range when the strike is outside the corridor
+    n = f_image_counts(s, xl, xh, IMAGE_SERIES_CONFIG)
 
+    (row, k) = ragged_images(n, n)
+    (m, s, xh, a1, a2, c) = (m[row], s[row], xh[row], a1[row], a2[row], c[row])
+    u = 2 * k * w[row]
 
-def PHI(a1, a2, b, s, nu):
-    return np.exp(0.5 * (nu * s) ** 2 - nu * b) * (norm.cdf(nu * s - (b + a1) / s) - norm.cdf(nu * s - (b + a2) / s))
+    # Direct images b = -m + u and reflected images b = -m - 2 * xh + u stacked along axis 0
+    b = np.stack([-m + u, -m - 2 * xh + u])
+    e = np.stack([np.exp(-c * u), -np.exp(c * (2 * xh - u))])
+    (y1, y2) = ((b + a1) / s, (b + a2) / s)
+    (N1, N2, N3, N4) = (ncdf(-y1), ncdf(-y2), ncdf(s - y1), ncdf(s - y2))
+
+    f0 = np.sum(e * (N1 - N2), axis=0)
+    f1 = np.sum(e * np.exp(0.5 * s ** 2 - b) * (N3 - N4), axis=0)
+    return tuple(np.bincount(row, weights=y, minlength=n.size).reshape(shape)[()] for y in (f0, f1))
+
+
+def f_image_counts(s, xl, xh, setting):
+    # images beyond the reach of every cdf argument are dropped
+    if setting["truncation"] == "fixed":
+        return np.full(s.shape, setting["fixed_terms"])
+
+    (tol, n_max) = (setting["tol"], setting["max_terms"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reach = 3 * np.maximum(np.abs(xl), np.abs(xh)) + s ** 2 + np.sqrt(-2 * np.log(tol)) * s
+        n = np.ceil(reach / (2 * (xh - xl)))
+
+    return np.clip(np.nan_to_num(n, nan=n_max, posinf=n_max, neginf=0), 1, n_max).astype(int)
 
 
 def double_barrier_option_payoff(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float, Ll: float, Lh: float,
-    rbt: Union[float, list[float]] = 1.0, PaE: Union[bool, list[bool]] = True
-) -> float:
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True
+) -> Numeric:
+    knockout, omega = get_double_barrier_flag(option_type)
+    (lR, uR) = split_pair(rbt)
     hit_lb, hit_ub = (S <= Ll), (S >= Lh)
-    eo_payoff = european_option_payoff(option_type[-1], S, K, T, r, q, sigma)
-    knockout = option_type[2].upper() == "O"
-    if knockout:
-        payoff = rbt[0] if hit_lb else rbt[1] if hit_ub else eo_payoff
-    else:
-        payoff = rbt if (~hit_lb & ~hit_ub) else eo_payoff
-    return payoff
+    eo_payoff = np.maximum(omega * (S - K), 0.0)
+    payoff = np.where(knockout == 1, np.where(hit_lb, lR, np.where(hit_ub, uR, eo_payoff)),
+                      np.where(hit_lb | hit_ub, eo_payoff, lR))
+    return np.asarray(payoff)[()]
 
 
 def double_barrier_option_bs_cf(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float, Ll: float, Lh: float,
-    rbt: Union[float, list[float]] = 1.0, PaE: Union[bool, list[bool]] = True
-) -> float:
-    dfr = np.exp(-r * T)
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True
+) -> Numeric:
+    knockout, omega = get_double_barrier_flag(option_type)
+    (lR, uR), (lPaE, uPaE) = split_pair(rbt), split_pair(PaE)
 
-    # SPECIAL HANDLING: when spot hits barrier at t = 0
-    hit_lb, hit_ub = (S <= Ll), (S >= Lh)
+    # KI uses barrier parity against the KO paying its (single) rebate at expiry on both barriers
+    ki = knockout == -1
+    (uR, lPaE, uPaE) = (np.where(ki, lR, uR), np.logical_or(lPaE, ki), np.logical_or(uPaE, ki))
 
-    if option_type[2].upper() == 'I':  # KI, use barrier parity
-        v_euro = european_option_bs_cf(option_type[-1], S, K, T, r, q, sigma)
-        option_type = str.replace(option_type, 'I', 'O')
-        v_ko = double_barrier_option_bs_cf(option_type, S, K, T, r, q, sigma, Ll, Lh, [rbt, rbt], [True, True])
-        return v_euro - v_ko + rbt * dfr
+    dfr = np.exp(-r * T)
+    mu_hat = (r - q) - sigma ** 2 / 2
+    mu_prime = np.sqrt(mu_hat ** 2 + 2 * r * sigma ** 2)
 
-    else:
-        (lR, uR, lPaE, uPaE) = (rbt[0], rbt[1], PaE[0], PaE[1])
+    (x0, xl, xh) = (np.log(K / S), np.log(Ll / S), np.log(Lh / S))
+    (m, s) = (mu_hat * T, sigma * np.sqrt(T))
 
-        mu_hat = (r - q) - sigma ** 2 / 2
-        mu_prime = np.sqrt(mu_hat ** 2 + 2 * r * sigma ** 2)
+    # Call integrates over [x0, xh], put over [xl, x0] with the sign flipped
+    (z1, z2) = (np.where(omega == 1, x0, xl), np.where(omega == 1, xh, x0))
+    (f0, f1) = f(m, s, xl, xh, z1, z2)
+    val = omega * (S * f1 - K * f0)
 
-        (x0, xl, xh) = (np.log(K / S), np.log(Ll / S), np.log(Lh / S))
+    val = dfr * val \
+          + val_rbt(lR, lPaE, T, mu_hat, mu_prime, sigma, xl, xh, -1, xl, dfr) \
+          + val_rbt(uR, uPaE, T, mu_hat, mu_prime, sigma, xl, xh, 1, xh, dfr)
 
-        if option_type[-1].upper() in ("C", "CALL"):
-            val = S * f(mu_hat * T, sigma * np.sqrt(T), xl, xh, 1, x0, xh) \
-                  - K * f(mu_hat * T, sigma * np.sqrt(T), xl, xh, 0, x0, xh)
-        else:
-            val = K * f(mu_hat * T, sigma * np.sqrt(T), xl, xh, 0, xl, x0) \
-                  - S * f(mu_hat * T, sigma * np.sqrt(T), xl, xh, 1, xl, x0)
+    # SPECIAL HANDLING: when spot hits barrier at t = 0
+    hit_lb, hit_ub = (S <= Ll), (S >= Lh)
+    val = np.where(hit_ub, uR * np.exp(-r * T * uPaE), np.where(hit_lb, lR * np.exp(-r * T * lPaE), val))
+
+    if np.any(ki):
+        val = np.where(ki, european_value(omega, S, K, T, r, q, sigma) - val + lR * dfr, val)
+
+    return np.asarray(val)[()]
+
+
+def heston_char_func(z, T, v0, kappa, vbar, xi, corr) -> tuple:
+    # psi(z) = E[exp(i * z * X_T)] of X_T = ln(S_T / S) - (r - q) * T ("little trap") and D, ln(psi) = C + D * v0
+    beta = kappa - corr * xi * 1j * z
+    d = np.sqrt(beta ** 2 + xi ** 2 * (z ** 2 + 1j * z))
+    g = (beta - d) / (beta + d)
+    e = np.exp(-d * T)
+    D = (beta - d) / xi ** 2 * (1 - e) / (1 - g * e)
+    C = kappa * vbar / xi ** 2 * ((beta - d) * T - 2 * np.log((1 - g * e) / (1 - g)))
+    return np.exp(C + D * v0), D
+
+
+@lru_cache(maxsize=256)
+def heston_quadrature(T: float, v0: float, kappa: float, vbar: float, xi: float, corr: float) -> tuple:
+    # nodes, weights (Lewis kernel folded in) and psi(u - i/2), D, d ln(psi) / dT on them, per (T, model params)
+    setting = HESTON_QUAD_CONFIG
+    u_grid = np.geomspace(1.0, setting["u_cap"], 64)
+    tail = np.abs(heston_char_func(u_grid - 0.5j, T, v0, kappa, vbar, xi, corr)[0]) / (u_grid ** 2 + 0.25)
+    u_max = u_grid[np.argmax(tail < setting["tol"])] if np.any(tail < setting["tol"]) else setting["u_cap"]
+
+    # Composite Gauss-Legendre: geometric panels resolve the kernel peak at u = 0, fixed-width panels the oscillations
+    width = setting["panel_width"]
+    edges = np.concatenate([[0.0], width * 2.0 ** np.arange(-6, 0), np.arange(width, u_max + width, width)])
+    (x, w) = np.polynomial.legendre.leggauss(setting["panel_nodes"])
+    (a, h) = (edges[:-1, None], 0.5 * np.diff(edges)[:, None])
+    u = (a + h * (x + 1)).ravel()
+    w = (h * w).ravel() / (u ** 2 + 0.25)
+
+    z = u - 0.5j
+    (psi, D) = heston_char_func(z, T, v0, kappa, vbar, xi, corr)
+    dD = 0.5 * xi ** 2 * D ** 2 - (kappa - corr * xi * 1j * z) * D - 0.5 * (z ** 2 + 1j * z)  # Riccati equation
+    dT = kappa * vbar * D + v0 * dD
+
+    for arr in (u, w, psi, D, dT):
+        arr.flags.writeable = False
+    return u, w, psi, D, dT
+
+
+def heston_integrals(k, T, v0, kappa, vbar, xi, corr, moments=lambda u, D, dT: [np.ones_like(u)]) -> np.ndarray:
+    # I_j = int_0^inf Re[exp(i * u * k) * m_j(u) * psi(u - i/2)] / (u ** 2 + 1/4) du, one row per trade
+    (k, T, v0, kappa, vbar, xi, corr) = (np.ravel(a) for a in np.broadcast_arrays(k, T, v0, kappa, vbar, xi, corr))
+    keys = np.stack([T, v0, kappa, vbar, xi, corr], axis=1)
+    (uniq, inv) = np.unique(keys, axis=0, return_inverse=True)
+    inv = inv.ravel()
+
+    out = None
+    for g, key in enumerate(uniq):
+        (u, w, psi, D, dT) = heston_quadrature(*map(float, key))
+        M = np.stack(moments(u, D, dT)) * psi * w
+        out = np.empty((k.size, len(M))) if out is None else out
+        rows = np.nonzero(inv == g)[0]
+        for i in range(0, rows.size, HESTON_QUAD_CONFIG["chunk"]):
+            chunk = rows[i:i + HESTON_QUAD_CONFIG["chunk"]]
+            out[chunk] = np.real(np.exp(1j * np.outer(k[chunk], u)) @ M.T)
+    return out
 
-        val = dfr * val \
-              + val_rbt(lR, lPaE, T, mu_hat, mu_prime, sigma, xl, xh, -1, xl, dfr) \
-              + val_rbt(uR, uPaE, T, mu_hat, mu_prime, sigma, xl, xh, 1, xh, dfr)
 
-        return uR * np.exp(-r * T * uPaE) if hit_ub else lR * np.exp(-r * T * lPaE) if hit_lb else val
+def european_option_heston_cf(
+    option_type: Union[str, np.ndarray], S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric,
+    kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7
+) -> Numeric:
+    # Heston (v0 = sigma ** 2) by the Lewis (2001) single integral
+    omega = cp2omega(option_type)
 
+    # one integral per broadcast market input, the option codes broadcast in the final np.where
+    k = np.log(S / K) + (r - q) * T
+    shape = np.broadcast(k, T, sigma, kappa, vbar, xi, corr).shape
+    I0 = heston_integrals(k, T, sigma ** 2, kappa, vbar, xi, corr)[:, 0].reshape(shape)
 
-def european_option_heston_cf(
-    option_type: str, S: float, K: float, T: float, r: float, q: float, sigma: float
-) -> float:
-    return 0.0
+    call = S * np.exp(-q * T) - np.sqrt(S * K) * np.exp(-0.5 * (r + q) * T) / np.pi * I0
+    val = np.where(omega == 1, call, call - S * np.exp(-q * T) + K * np.exp(-r * T))
+
+    return np.asarray(val)[()]
@@ -0,0 +1,63 @@
+import numpy as np
+from scipy.interpolate import CubicSpline
+from typing import Callable, Union
+
+from methods.close_form import Numeric, heston_char_func
+from utils.configs import FFT_CONFIG
+from utils.flag_utils import cp2omega
+
+
+def bs_char_func(z, T, sigma):
+    # characteristic function of X_T = ln(S_T / S) - (r - q) * T under Black-Scholes
+    return np.exp(-0.5 * sigma ** 2 * T * (z ** 2 + 1j * z))
+
+
+def fft_call_grid(S: float, T: float, r: float, q: float, char_func: Callable) -> tuple:
+    # Carr-Madan (1999): (log-strikes, call prices) on the grid k_u = ln(F) - b + lbd * u from one FFT
+    (n, eta, alpha) = (FFT_CONFIG["n"], FFT_CONFIG["eta"], FFT_CONFIG["alpha"])
+    lbd = 2 * np.pi / (n * eta)
+    b = 0.5 * n * lbd
+    x0 = np.log(S) + (r - q) * T
+
+    v = eta * np.arange(n)
+    z = v - (alpha + 1) * 1j
+    psi = np.exp(-r * T + (alpha + 1) * x0) * char_func(z) / (alpha ** 2 + alpha - v ** 2 + 1j * (2 * alpha + 1) * v)
+    simpson = eta / 3 * (3 + (-1) ** (np.arange(n) + 1) - (np.arange(n) == 0))
+
+    k = x0 - b + lbd * np.arange(n)
+    call = np.exp(-alpha * k) / np.pi * np.real(np.fft.fft(np.exp(1j * v * b) * psi * simpson))
+    return k, call
+
+
+def european_option_fft(omega, S, K, T, r, q, char_func: Callable, keys: tuple) -> Numeric:
+    # one FFT grid per (S, T, r, q, model params), strikes off a cubic spline, puts by put-call parity
+    (omega, S, K, T, r, q, *keys) = np.broadcast_arrays(omega, S, K, T, r, q, *keys)
+    shape = S.shape
+    (omega, S, K, T, r, q, *keys) = (np.ravel(a) for a in (omega, S, K, T, r, q, *keys))
+    (uniq, inv) = np.unique(np.stack([S, T, r, q, *keys], axis=1), axis=0, return_inverse=True)
+    inv = inv.ravel()
+
+    call = np.empty(S.size)
+    for g, (S_g, T_g, r_g, q_g, *key) in enumerate(uniq):
+        (k, c) = fft_call_grid(S_g, T_g, r_g, q_g, lambda z: char_func(z, T_g, *key))
+        rows = np.nonzero(inv == g)[0]
+        call[rows] = CubicSpline(k, c)(np.log(K[rows]))
+
+    val = np.where(omega == 1, call, call - S * np.exp(-q * T) + K * np.exp(-r * T))
+    return val.reshape(shape)[()]
+
+
+def european_option_bs_fft(
+    option_type: Union[str, np.ndarray], S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric
+) -> Numeric:
+    omega = cp2omega(option_type)
+    return european_option_fft(omega, S, K, T, r, q, bs_char_func, (sigma,))
+
+
+def european_option_heston_fft(
+    option_type: Union[str, np.ndarray], S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric,
+    kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7
+) -> Numeric:
+    omega = cp2omega(option_type)
+    char_func = lambda z, T, v0, kappa, vbar, xi, corr: heston_char_func(z, T, v0, kappa, vbar, xi, corr)[0]
+    return european_option_fft(omega, S, K, T, r, q, char_func, (sigma ** 2, kappa, vbar, xi, corr))
@@ -0,0 +1,399 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+from typing import Callable, Union
+
+from methods.close_form import Numeric, split_pair, trade_rows
+from utils.configs import MC_CONFIG
+from utils.constants import ONE_DAY
+from utils.flag_utils import cp2omega, get_touch_flag, get_double_touch_flag, get_barrier_flag, get_double_barrier_flag
+
+
+# ------------ 0. Path generators -----------------
+# normals z (n_factors, n_steps, n_paths) -> log-spot x on the grid t and the integrated variance var of every step
+
+def gbm_paths(z: np.ndarray, trade: dict) -> tuple:
+    (S, T, r, q, sigma) = (trade["S"], trade["T"], trade["r"], trade["q"], trade["sigma"])
+    (n_steps, n_paths) = z.shape[1:]
+    (t, dt) = (np.linspace(0.0, T, n_steps + 1), T / n_steps)
+    dx = (r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * z[0]
+    x = np.log(S) + np.vstack([np.zeros((1, n_paths)), np.cumsum(dx, axis=0)])
+    return x, np.full((n_steps, n_paths), sigma ** 2 * dt), t
+
+
+def heston_paths(z: np.ndarray, trade: dict) -> tuple:
+    # full truncation Euler, v0 = sigma ** 2, z[0] drives the variance and z[1] the independent part of the spot
+    (S, T, r, q, sigma) = (trade["S"], trade["T"], trade["r"], trade["q"], trade["sigma"])
+    (kappa, vbar, xi, corr) = (trade["kappa"], trade["vbar"], trade["xi"], trade["corr"])
+    (n_steps, n_paths) = z.shape[1:]
+    (t, dt) = (np.linspace(0.0, T, n_steps + 1), T / n_steps)
+
+    x = np.empty((n_steps + 1, n_paths))
+    var = np.empty((n_steps, n_paths))
+    (x[0], v) = (np.log(S), np.full(n_paths, sigma ** 2))
+    for i in range(n_steps):
+        (z_v, z_s) = z[:, i]
+        var[i] = np.maximum(v, 0.0) * dt
+        x[i + 1] = x[i] + (r - q) * dt - 0.5 * var[i] + np.sqrt(var[i]) * (corr * z_v + np.sqrt(1 - corr ** 2) * z_s)
+        v = v + kappa * (vbar - np.maximum(v, 0.0)) * dt + xi * np.sqrt(var[i]) * z_v
+    return x, var, t
+
+
+def gbm_score(z: np.ndarray, trade: dict) -> np.ndarray:
+    # derivative of the log-density of the first log-spot step w.r.t. its starting point log(S)
+    return z[0, 0] / (trade["sigma"] * np.sqrt(trade["T"] / z.shape[1]))
+
+
+def heston_score(z: np.ndarray, trade: dict) -> np.ndarray:
+    # the same conditional on the variance draw z[0, 0], the spot step keeps the residual variance v0 dt (1 - corr^2)
+    return z[1, 0] / (trade["sigma"] * np.sqrt(trade["T"] / z.shape[1] * (1 - trade["corr"] ** 2)))
+
+
+# number of independent normals each path generator consumes per time step, and its first step score
+PATH_FACTORS = {gbm_paths: 1, heston_paths: 2}
+PATH_SCORES = {gbm_paths: gbm_score, heston_paths: heston_score}
+
+
+# ------------ 1. Normal samplers -----------------
+# normals (n_factors, n_steps, m) of the chunk of m paths from path start, seeded by the chunk's own SeedSequence
+
+def pseudo_normals(seed: np.random.SeedSequence, n_factors: int, n_steps: int, m: int, start: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n_factors, n_steps, m))
+
+
+def brownian_bridge(z: np.ndarray) -> np.ndarray:
+    # normalised increments of a Brownian path built by bisection: z[0] is the end point, then ever finer mid points
+    n_steps = z.shape[0]
+    w = np.zeros((n_steps + 1,) + z.shape[1:])
+    w[n_steps] = np.sqrt(n_steps) * z[0]
+    (intervals, k) = ([(0, n_steps)], 1)
+    for (left, right) in intervals:
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        w[mid] = ((right - mid) * w[left] + (mid - left) * w[right]) / (right - left) \
+            + np.sqrt((mid - left) * (right - mid) / (right - left)) * z[k]
+        intervals += [(left, mid), (mid, right)]
+        k += 1
+    return np.diff(w, axis=0)
+
+
+def sobol_normals(seed: np.random.SeedSequence, n_factors: int, n_steps: int, m: int, start: int) -> np.ndarray:
+    # points start, ..., start + m - 1 of a scrambled Sobol sequence, step-major in Brownian-bridge order
+    # seeded from the state words, qmc.Sobol spawns from a SeedSequence it is handed and would alter the scramble
+    sobol = qmc.Sobol(n_steps * n_factors, scramble=True, seed=np.random.default_rng(seed.generate_state(4)))
+    if start:
+        sobol.fast_forward(start)
+    u = np.clip(sobol.random(m), 1e-16, 1 - 1e-16)
+    z = ndtri(u).T.reshape(n_steps, n_factors, m)
+    return np.moveaxis(brownian_bridge(z), 1, 0)
+
+
+SAMPLERS = {"pseudo": pseudo_normals, "sobol": sobol_normals}
+
+
+# ------------ 2. Barrier monitoring ---------------
+
+def crossing_prob(x0: np.ndarray, x1: np.ndarray, var: np.ndarray, b: float) -> np.ndarray:
+    # probability that the Brownian bridge from x0 to x1 touches the log-barrier b, 1 if an end point is beyond it
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.exp(-2 * (b - x0) * (b - x1) / var)
+    return np.where((b - x0) * (b - x1) <= 0, 1.0, np.nan_to_num(p, nan=0.0))
+
+
+def first_hit(x: np.ndarray, var: np.ndarray, t: np.ndarray, lb: float, ub: float, r: float) -> tuple:
+    # per path first-hit probabilities of the lower / upper barrier, undiscounted and discounted, and of no hit
+    (q_l, q_u) = (crossing_prob(x[:-1], x[1:], var, lb), crossing_prob(x[:-1], x[1:], var, ub))
+    q_l = np.vstack([(x[0] <= lb)[None, :], q_l])
+    q_u = np.vstack([(x[0] >= ub)[None, :], q_u])
+    q = 1 - (1 - q_l) * (1 - q_u)
+
+    alive = np.vstack([np.ones((1, x.shape[1])), np.cumprod(1 - q, axis=0)])
+    hit = alive[:-1] * q
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share_l = np.nan_to_num(q_l / (q_l + q_u), nan=0.0)
+    disc = np.exp(-r * np.concatenate([[0.0], 0.5 * (t[:-1] + t[1:])]))[:, None]
+
+    (hit_l, hit_u) = (hit * share_l, hit * (1 - share_l))
+    return hit_l.sum(axis=0), hit_u.sum(axis=0), (hit_l * disc).sum(axis=0), (hit_u * disc).sum(axis=0), alive[-1]
+
+
+def rebate_value(rbt, PaE, p_hit, p_hit_disc, dfr):
+    # rebate paid at expiry (PaE) or at hit
+    return rbt * (dfr * p_hit if PaE else p_hit_disc)
+
+
+# ------------ 3. Discounted path values -----------
+
+def european_values(x, var, t, trade):
+    (K, T, r) = (trade["K"], trade["T"], trade["r"])
+    omega = cp2omega(trade["option_type"])
+    return np.exp(-r * T) * np.maximum(omega * (np.exp(x[-1]) - K), 0.0)
+
+
+def single_touch_values(x, var, t, trade):
+    (T, r, L, rbt, PaE) = (trade["T"], trade["r"], trade["L"], trade["rbt"], trade["PaE"])
+    eta, touch = get_touch_flag(trade["option_type"])
+    (lb, ub) = (np.log(L), np.inf) if eta == 1 else (-np.inf, np.log(L))
+    (p_l, p_u, d_l, d_u, alive) = first_hit(x, var, t, lb, ub, r)
+    dfr = np.exp(-r * T)
+    return rebate_value(rbt, PaE, p_l + p_u, d_l + d_u, dfr) if touch else rbt * dfr * alive
+
+
+def double_touch_values(x, var, t, trade):
+    (T, r, Ll, Lh) = (trade["T"], trade["r"], trade["Ll"], trade["Lh"])
+    with_l, with_u, no_touch = get_double_touch_flag(trade["option_type"])
+    (lR, uR), (lPaE, uPaE) = split_pair(trade["rbt"]), split_pair(trade["PaE"])
+    (p_l, p_u, d_l, d_u, alive) = first_hit(x, var, t, np.log(Ll), np.log(Lh), r)
+    dfr = np.exp(-r * T)
+    if no_touch:
+        return lR * dfr * alive
+    return with_l * rebate_value(lR, lPaE, p_l, d_l, dfr) + with_u * rebate_value(uR, uPaE, p_u, d_u, dfr)
+
+
+def single_barrier_values(x, var, t, trade):
+    (K, T, r, L, rbt, PaE) = (trade["K"], trade["T"], trade["r"], trade["L"], trade["rbt"], trade["PaE"])
+    eta, knockout, omega = get_barrier_flag(trade["option_type"])
+    (lb, ub) = (np.log(L), np.inf) if eta == 1 else (-np.inf, np.log(L))
+    (p_l, p_u, d_l, d_u, alive) = first_hit(x, var, t, lb, ub, r)
+    dfr = np.exp(-r * T)
+    payoff = dfr * np.maximum(omega * (np.exp(x[-1]) - K), 0.0)
+    if knockout == 1:
+        return payoff * alive + rebate_value(rbt, PaE, p_l + p_u, d_l + d_u, dfr)
+    return payoff * (1 - alive) + rbt * dfr * alive  # KI rebate is paid at expiry when never knocked in
+
+
+def double_barrier_values(x, var, t, trade):
+    (K, T, r, Ll, Lh) = (trade["K"], trade["T"], trade["r"], trade["Ll"], trade["Lh"])
+    knockout, omega = get_double_barrier_flag(trade["option_type"])
+    (lR, uR), (lPaE, uPaE) = split_pair(trade["rbt"]), split_pair(trade["PaE"])
+    (p_l, p_u, d_l, d_u, alive) = first_hit(x, var, t, np.log(Ll), np.log(Lh), r)
+    dfr = np.exp(-r * T)
+    payoff = dfr * np.maximum(omega * (np.exp(x[-1]) - K), 0.0)
+    if knockout == 1:
+        return payoff * alive + rebate_value(lR, lPaE, p_l, d_l, dfr) + rebate_value(uR, uPaE, p_u, d_u, dfr)
+    return payoff * (1 - alive) + lR * dfr * alive
+
+
+# ------------ 4. Simulation driver ----------------
+
+# outputs of path_greeks, "price" alone is the output of path_values
+MC_GREEKS = ["price", "delta", "gamma", "vega", "rho", "theta"]
+
+
+def merge_moments(a: tuple, b: tuple) -> tuple:
+    # merge (count, mean, sum of squared deviations) of two samples (Chan et al.)
+    (n_a, mean_a, m2_a), (n_b, mean_b, m2_b) = a, b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+
+def path_values(paths: Callable, values: Callable, z: np.ndarray, trade: dict) -> np.ndarray:
+    return values(*paths(z, trade), trade)[None, :]
+
+
+def path_greeks(paths: Callable, values: Callable, z: np.ndarray, trade: dict) -> np.ndarray:
+    # per path price and pathwise greeks (units of BSGreeks) from one set of draws, gamma with the first-step score
+    h = MC_CONFIG["pathwise_bump"]
+    (x, var, t) = paths(z, trade)
+    e0 = np.eye(x.shape[0], 1)
+    shifted = lambda a, a0: values(x + a + a0 * e0, var, t, trade)
+    (y_uu, y_ud, y_du, y_dd) = (shifted(h, h), shifted(h, -h), shifted(-h, h), shifted(-h, -h))
+    dy = (y_uu + y_ud - y_du - y_dd) / (4 * h)
+    d2y = dy * PATH_SCORES[paths](z, trade) + (y_uu - y_ud - y_du + y_dd) / (4 * h ** 2)
+
+    y = values(x, var, t, trade)
+    bumped = lambda key, a: values(*paths(z, {**trade, key: trade[key] + a}), {**trade, key: trade[key] + a})
+    S = trade["S"]
+    return np.stack([
+        y,
+        dy / S,
+        (d2y - dy) / S ** 2,
+        (bumped("sigma", h) - y) / h / 100,
+        (bumped("r", h) - y) / h / 100,
+        (bumped("T", -h) - y) / h * ONE_DAY
+    ])
+
+
+def chunk_moments(task: tuple) -> tuple:
+    # (count, mean, sum of squared deviations) of the per path estimates of one chunk
+    (estimator, paths, values, trade, normals, seed, start, m, n_steps) = task
+    y = estimator(paths, values, normals(seed, PATH_FACTORS[paths], n_steps, m, start), trade)
+    mean = y.mean(axis=1)
+    return m, mean, ((y - mean[:, None]) ** 2).sum(axis=1)
+
+
+def chunk_tasks(
+    estimator: Callable, paths: Callable, values: Callable, trade: dict, n_paths: int, n_steps: int, seed, sampler: str
+) -> list:
+    # groups of chunk tasks of one trade: one group for "pseudo", one per scramble for "sobol"
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown Monte Carlo sampler {sampler!r}, expected one of {list(SAMPLERS)}")
+    chunk = MC_CONFIG["chunk"]
+    if sampler == "sobol":
+        chunk = 2 ** int(np.log2(chunk))  # powers of two keep the balance properties of the sequence
+        n_paths = 2 ** int(np.ceil(np.log2(max(n_paths / MC_CONFIG["n_scrambles"], 1))))
+        streams = np.random.SeedSequence(seed).spawn(MC_CONFIG["n_scrambles"])
+        return [[(estimator, paths, values, trade, sobol_normals, s, start, min(chunk, n_paths - start), n_steps)
+                 for start in range(0, n_paths, chunk)] for s in streams]
+    starts = range(0, n_paths, chunk)
+    streams = np.random.SeedSequence(seed).spawn(len(starts))
+    return [[(estimator, paths, values, trade, pseudo_normals, s, start, min(chunk, n_paths - start), n_steps)
+             for (s, start) in zip(streams, starts)]]
+
+
+def run_tasks(tasks: list) -> list:
+    # chunk moments in task order, fanned out over MC_CONFIG["n_workers"] processes
+    n_workers = MC_CONFIG["n_workers"]
+    if n_workers == 1 or len(tasks) == 1:
+        return list(map(chunk_moments, tasks))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(chunk_moments, tasks, chunksize=max(1, len(tasks) // (4 * n_workers))))
+
+
+def estimate(groups: list) -> tuple:
+    # price and standard error from the chunk moments merged in order, across scrambles from the group means
+    moments = [reduce(merge_moments, g) for g in groups]
+    if len(moments) == 1:
+        (n, mean, m2) = moments[0]
+        return mean, np.sqrt(m2 / (n - 1) / n)
+    means = np.array([mean for (n, mean, m2) in moments])
+    return means.mean(axis=0), means.std(axis=0, ddof=1) / np.sqrt(len(means))
+
+
+def mc_price(
+    paths: Callable, values: Callable, trade: dict, n_paths: int = None, n_steps: int = None, seed=None,
+    sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    # all chunks of a batch go to the workers in one go, every trade reuses the seed (common random numbers)
+    n_paths = MC_CONFIG["n_paths"] if n_paths is None else n_paths
+    n_steps = MC_CONFIG["n_steps"] if n_steps is None else n_steps
+    seed = MC_CONFIG["seed"] if seed is None else seed
+    sampler = MC_CONFIG["sampler"] if sampler is None else sampler
+
+    (estimator, outputs) = (path_greeks, MC_GREEKS) if return_greeks else (path_values, MC_GREEKS[:1])
+    (shape, rows) = trade_rows(trade)
+    groups = {idx: chunk_tasks(estimator, paths, values, trade_i, n_paths, n_steps, seed, sampler)
+              for (idx, trade_i) in rows}
+
+    results = iter(run_tasks([task for g in groups.values() for group in g for task in group]))
+    (price, std_err) = (np.empty(shape + (len(outputs),)), np.empty(shape + (len(outputs),)))
+    for idx, g in groups.items():
+        (price[idx], std_err[idx]) = estimate([[next(results) for _ in group] for group in g])
+
+    if return_greeks:
+        (price, std_err) = ({k: price[..., j][()] for j, k in enumerate(outputs)},
+                            {k: std_err[..., j][()] for j, k in enumerate(outputs)})
+    else:
+        (price, std_err) = (price[..., 0][()], std_err[..., 0][()])
+    return (price, std_err) if return_error else price
+
+
+# ------------ 5. Pricers --------------------------
+
+def european_option_bs_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, n_paths: int = None,
+    n_steps: int = 1, seed=None, sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma)
+    return mc_price(gbm_paths, european_values, trade, n_paths, n_steps, seed, sampler, return_greeks, return_error)
+
+
+def single_touch_option_bs_mc(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric, rbt: Numeric = 1.0,
+    PaE: bool = True, n_paths: int = None, n_steps: int = None, seed=None, sampler: str = None,
+    return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE)
+    return mc_price(gbm_paths, single_touch_values, trade, n_paths, n_steps, seed, sampler, return_greeks, return_error)
+
+
+def double_touch_option_bs_mc(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, n_paths: int = None, n_steps: int = None, seed=None,
+    sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE)
+    return mc_price(gbm_paths, double_touch_values, trade, n_paths, n_steps, seed, sampler, return_greeks, return_error)
+
+
+def single_barrier_option_bs_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: bool = True, n_paths: int = None, n_steps: int = None, seed=None, sampler: str = None,
+    return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE)
+    return mc_price(gbm_paths, single_barrier_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
+
+
+def double_barrier_option_bs_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, n_paths: int = None,
+    n_steps: int = None, seed=None, sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE)
+    return mc_price(gbm_paths, double_barrier_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
+
+
+def european_option_heston_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, kappa: Numeric = 2.0,
+    vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7, n_paths: int = None, n_steps: int = None, seed=None,
+    sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, kappa=kappa, vbar=vbar, xi=xi,
+                 corr=corr)
+    return mc_price(heston_paths, european_values, trade, n_paths, n_steps, seed, sampler, return_greeks, return_error)
+
+
+def single_touch_option_heston_mc(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric, rbt: Numeric = 1.0,
+    PaE: bool = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7,
+    n_paths: int = None, n_steps: int = None, seed=None, sampler: str = None, return_greeks: bool = False,
+    return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE, kappa=kappa,
+                 vbar=vbar, xi=xi, corr=corr)
+    return mc_price(heston_paths, single_touch_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
+
+
+def double_touch_option_heston_mc(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04,
+    xi: Numeric = 0.3, corr: Numeric = -0.7, n_paths: int = None, n_steps: int = None, seed=None, sampler: str = None,
+    return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE,
+                 kappa=kappa, vbar=vbar, xi=xi, corr=corr)
+    return mc_price(heston_paths, double_touch_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
+
+
+def single_barrier_option_heston_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: bool = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3,
+    corr: Numeric = -0.7, n_paths: int = None, n_steps: int = None, seed=None, sampler: str = None,
+    return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE, kappa=kappa,
+                 vbar=vbar, xi=xi, corr=corr)
+    return mc_price(heston_paths, single_barrier_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
+
+
+def double_barrier_option_heston_mc(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, kappa: Numeric = 2.0,
+    vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7, n_paths: int = None, n_steps: int = None, seed=None,
+    sampler: str = None, return_greeks: bool = False, return_error: bool = False
+) -> Union[Numeric, dict, tuple]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE,
+                 kappa=kappa, vbar=vbar, xi=xi, corr=corr)
+    return mc_price(heston_paths, double_barrier_values, trade, n_paths, n_steps, seed, sampler, return_greeks,
+                    return_error)
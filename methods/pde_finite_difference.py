@@ -0,0 +1,567 @@
+import numpy as np
+from scipy.interpolate import CubicSpline, PPoly
+from scipy.linalg.lapack import dgttrf, dgttrs
+from typing import Callable, Union
+
+from methods.close_form import Numeric, european_option_heston_cf, european_value, split_pair, trade_rows
+from utils.configs import HESTON_PDE_CONFIG, PDE_CONFIG
+from utils.constants import ONE_DAY
+from utils.flag_utils import cp2omega, get_touch_flag, get_double_touch_flag, get_barrier_flag, get_double_barrier_flag
+
+# V_tau = 0.5 * sigma^2 * V_xx + (r - q - 0.5 * sigma^2) * V_x - r * V in x = log(S), barriers are the grid ends
+# boundary triple c: c[0] + c[1] * exp(-r tau) + c[2] * exp(-q tau)
+
+ZERO = (0.0, 0.0, 0.0)
+
+
+# ------------ 0. Grids and boundaries -----------
+
+def log_domain(
+    S: np.ndarray, T: float, sigma: float, levels: list = (), lower: float = None, upper: float = None
+) -> tuple:
+    # log-spot interval: the barriers, or n_sd standard deviations beyond the spots and levels
+    width = PDE_CONFIG["n_sd"] * sigma * np.sqrt(T)
+    centres = np.log(np.append(S, levels))
+    x_lo = centres.min() - width if lower is None else np.log(lower)
+    x_hi = centres.max() + width if upper is None else np.log(upper)
+    return x_lo, x_hi
+
+
+def uniform_grid(x_lo: float, x_hi: float, n_space: int, centres: list = ()) -> np.ndarray:
+    return np.linspace(x_lo, x_hi, n_space)
+
+
+def stretched_grid(
+    x_lo: float, x_hi: float, n_space: int, centres: list = (), stretch: float = None
+) -> np.ndarray:
+    # nodes concentrated around the centres by sinh stretching, uniform without centres
+    centres = [c for c in centres if x_lo <= c <= x_hi]
+    if not centres:
+        return uniform_grid(x_lo, x_hi, n_space)
+    alpha = (PDE_CONFIG["stretch"] if stretch is None else stretch) * (x_hi - x_lo)
+    fine = np.linspace(x_lo, x_hi, 32 * n_space)
+    cdf = sum(np.arcsinh((fine - c) / alpha) for c in centres)
+    x = np.interp(np.linspace(cdf[0], cdf[-1], n_space), cdf, fine)
+    (x[0], x[-1]) = (x_lo, x_hi)
+    return x
+
+
+MESHES = {"uniform": uniform_grid, "stretched": stretched_grid}
+
+
+def boundary_value(c: tuple, tau: float, r: float, q: float) -> Numeric:
+    return c[0] + c[1] * np.exp(-r * tau) + c[2] * np.exp(-q * tau)
+
+
+def rebate_boundary(rbt: Numeric, PaE: bool) -> tuple:
+    # rebate paid at hit, or at expiry (discounted over the remaining time)
+    return (0.0, rbt, 0.0) if PaE else (rbt, 0.0, 0.0)
+
+
+def vanilla_boundary(omega: int, K: float, x_end: float, is_upper: bool) -> tuple:
+    # deep in-the-money end: discounted forward minus discounted strike, zero at the out-of-the-money end
+    if (omega == 1) == is_upper:
+        return 0.0, -omega * K, omega * np.exp(x_end)
+    return ZERO
+
+
+def vanilla_payoff(x: np.ndarray, K: float, omega: int) -> np.ndarray:
+    # max(omega * (e^x - K), 0) at the nodes, cell-averaged at the strike node only
+    edges = np.concatenate([[x[0]], 0.5 * (x[1:] + x[:-1]), [x[-1]]])
+    (a, b, k) = (edges[:-1], edges[1:], np.log(K))
+    if omega == 1:
+        (a, b) = (np.maximum(a, k), np.maximum(b, k))
+        integral = (np.exp(b) - K * b) - (np.exp(a) - K * a)
+    else:
+        (a, b) = (np.minimum(a, k), np.minimum(b, k))
+        integral = (K * b - np.exp(b)) - (K * a - np.exp(a))
+    kink = (edges[:-1] < k) & (edges[1:] > k)
+    width = np.where(kink, edges[1:] - edges[:-1], 1.0)
+    return np.where(kink, integral / width, np.maximum(omega * (np.exp(x) - K), 0.0))
+
+
+# ------------ 1. Crank-Nicolson solver ----------
+
+def fd_weights(z: np.ndarray) -> tuple:
+    # (sub, diag, super) weights of the first and second derivative on a non-uniform grid z
+    (h_m, h_p) = (z[1:-1] - z[:-2], z[2:] - z[1:-1])
+    pad = lambda w: np.concatenate([[0.0], w, [0.0]])
+    d1 = (pad(-h_p / (h_m * (h_m + h_p))), pad((h_p - h_m) / (h_m * h_p)), pad(h_m / (h_p * (h_m + h_p))))
+    d2 = (pad(2 / (h_m * (h_m + h_p))), pad(-2 / (h_m * h_p)), pad(2 / (h_p * (h_m + h_p))))
+    return d1, d2
+
+
+def bs_operator(x: np.ndarray, r: float, q: float, sigma: float) -> tuple:
+    # (sub, diag, super) diagonals of the discretised operator, zero end rows
+    (d1, d2) = fd_weights(x)
+    (nu, half_var) = (r - q - 0.5 * sigma ** 2, 0.5 * sigma ** 2)
+    interior = np.pad(np.ones(len(x) - 2), 1)
+    return tuple(half_var * d2[k] + nu * d1[k] - r * interior * (k == 1) for k in range(3))
+
+
+def factorize(op: tuple, dt: float, theta: float) -> tuple:
+    # (I - theta dt L) V_new = (I + (1 - theta) dt L) V, factored once per step size
+    (sub, diag, sup) = op
+    (dl, d, du, du2, ipiv, info) = dgttrf(-theta * dt * sub[1:], 1 - theta * dt * diag, -theta * dt * sup[:-1])
+    explicit = ((1 - theta) * dt * sub[1:-1, None], 1 + (1 - theta) * dt * diag[1:-1, None],
+                (1 - theta) * dt * sup[1:-1, None])
+    return (dl, d, du, du2, ipiv), explicit
+
+
+def theta_step(lu: tuple, explicit: tuple, V: np.ndarray, v_lo: np.ndarray, v_hi: np.ndarray) -> np.ndarray:
+    # the end rows carry the boundary values of the new level
+    rhs = np.empty_like(V)
+    rhs[1:-1] = explicit[0] * V[:-2] + explicit[1] * V[1:-1] + explicit[2] * V[2:]
+    (rhs[0], rhs[-1]) = (v_lo, v_hi)
+    return dgttrs(*lu, rhs)[0]
+
+
+def time_steps(T: float, n_time: int) -> list:
+    # (dt, theta) of every step from expiry, the first rannacher_steps steps are split into implicit Euler half steps
+    n_euler = min(PDE_CONFIG["rannacher_steps"], n_time)
+    dt = T / n_time
+    return [(0.5 * dt, 1.0)] * (2 * n_euler) + [(dt, 0.5)] * (n_time - n_euler)
+
+
+def crank_nicolson(
+    x: np.ndarray, payoff: np.ndarray, T: float, r: float, q: float, sigma: float, lower: tuple, upper: tuple,
+    n_time: int = None
+) -> tuple:
+    # march the payoff columns back to tau = T, returns the last two time levels and the last step size
+    n_time = PDE_CONFIG["n_time"] if n_time is None else n_time
+    op = bs_operator(x, r, q, sigma)
+    steps = time_steps(T, n_time)
+    factors = {step: factorize(op, *step) for step in set(steps)}
+
+    V = payoff.reshape(len(x), -1).astype(float)
+    tau = np.cumsum([dt for (dt, theta) in steps])[:, None]
+    ones = np.ones(V.shape[1])
+    (v_lo, v_hi) = (boundary_value(lower, tau, r, q) * ones, boundary_value(upper, tau, r, q) * ones)
+    V_prev = V
+    for (n, step) in enumerate(steps):
+        (V_prev, V) = (V, theta_step(*factors[step], V, v_lo[n], v_hi[n]))
+    return V.reshape(payoff.shape), V_prev.reshape(payoff.shape), steps[-1][0]
+
+
+def bs_grid(
+    x_lo: float, x_hi: float, market: dict, payoff: Callable, lower: tuple, upper: tuple, levels: list, S: np.ndarray
+) -> tuple:
+    # with tol the grid is doubled from n_min nodes until the change at the spots S is below tol (or n_max)
+    (T, r, q, sigma) = (market["T"], market["r"], market["q"], market["sigma"])
+    mesh = MESHES[PDE_CONFIG["mesh"]]
+    centres = np.log(levels)
+    if PDE_CONFIG["tol"] is None:
+        x = mesh(x_lo, x_hi, PDE_CONFIG["n_space"], centres)
+        return (x,) + crank_nicolson(x, payoff(x), T, r, q, sigma, lower, upper)
+
+    (n_space, ratio, prev) = (PDE_CONFIG["n_min"], PDE_CONFIG["n_time"] / PDE_CONFIG["n_space"], None)
+    x_S = np.log(np.clip(S, np.exp(x_lo), np.exp(x_hi)))
+    while True:
+        x = mesh(x_lo, x_hi, n_space, centres)
+        grid = (x,) + crank_nicolson(x, payoff(x), T, r, q, sigma, lower, upper, max(int(ratio * n_space), 1))
+        at_spots = CubicSpline(x, grid[1])(x_S)
+        converged = prev is not None and np.max(np.abs(at_spots - prev)) / 3 < PDE_CONFIG["tol"]
+        if converged or n_space >= PDE_CONFIG["n_max"]:
+            return grid
+        (n_space, prev) = (2 * n_space, at_spots)
+
+
+# ------------ 2. Heston ADI solver ---------------
+# Heston PDE split into the mixed term A0, the x terms A1 and the v terms A2, ADI of in 't Hout & Foulon (2010)
+
+ADI_THETA = {"douglas": 0.5, "cs": 0.5, "mcs": 1 / 3, "hv": 0.5 + np.sqrt(3) / 6}
+
+
+def heston_operators(x: np.ndarray, v: np.ndarray, market: dict) -> tuple:
+    # diagonals (n_x, n_v) of A1 along x and A2 along v, and the first derivative weights for A0
+    (r, q, kappa, vbar, xi) = (market["r"], market["q"], market["kappa"], market["vbar"], market["xi"])
+    ((d1x, d2x), (d1v, d2v)) = (fd_weights(x), fd_weights(v))
+    (h_0, h_n) = (v[1] - v[0], v[-1] - v[-2])
+    (d1v[1][0], d1v[2][0]) = (-1 / h_0, 1 / h_0)  # forward difference at v = 0
+    (d2v[0][-1], d2v[1][-1]) = (2 / h_n ** 2, -2 / h_n ** 2)  # reflected node at v_max
+    interior = np.pad(np.ones(len(x) - 2), 1)[:, None]
+    A1 = tuple(interior * (0.5 * v * d2x[k][:, None] + (r - q - 0.5 * v) * d1x[k][:, None] - 0.5 * r * (k == 1))
+               for k in range(3))
+    A2 = tuple(interior * (0.5 * xi ** 2 * v * d2v[k] + kappa * (vbar - v) * d1v[k] - 0.5 * r * (k == 1))
+               for k in range(3))
+    return A1, A2, (d1x, fd_weights(v)[0])
+
+
+def tridiag_apply(op: tuple, U: np.ndarray, axis: int) -> np.ndarray:
+    # op (sub, diag, super) along axis applied to U of shape (n_x, n_v, columns)
+    (sub, diag, sup) = (np.moveaxis(o[..., None], axis, 0) for o in op)
+    U = np.moveaxis(U, axis, 0)
+    out = diag * U
+    out[1:] += sub[1:] * U[:-1]
+    out[:-1] += sup[:-1] * U[1:]
+    return np.moveaxis(out, 0, axis)
+
+
+def mixed_apply(d1: tuple, v: np.ndarray, corr_xi: float, U: np.ndarray) -> np.ndarray:
+    # A0 U = corr * xi * v * V_xv with central differences, zero on the edges of the grid
+    (d1x, d1v) = d1
+    V_x = tridiag_apply(tuple(w[:, None] for w in d1x), U, 0)
+    return corr_xi * v[:, None] * tridiag_apply(tuple(w[None, :] for w in d1v), V_x, 1)
+
+
+def line_factor(op: tuple, c: float, axis: int) -> tuple:
+    # LU factors of I - c * op along axis, the grid lines stacked into one tridiagonal system
+    (sub, diag, sup) = (np.moveaxis(np.broadcast_to(o, op[1].shape), axis, 1).ravel() for o in op)
+    return dgttrf(-c * sub[1:], 1 - c * diag, -c * sup[:-1])[:5]
+
+
+def line_solve(lu: tuple, R: np.ndarray, axis: int) -> np.ndarray:
+    R = np.moveaxis(R, axis, 1)
+    X = dgttrs(*lu, R.reshape(-1, R.shape[-1]))[0].reshape(R.shape)
+    return np.moveaxis(X, 1, axis)
+
+
+def adi_step(U, dt, theta, scheme, ops, factors, v, corr_xi, bc) -> np.ndarray:
+    # one Douglas / Craig-Sneyd / modified Craig-Sneyd / Hundsdorfer-Verwer step, bc: the x end values of the new level
+    (A1, A2, d1) = ops
+    apply = [lambda W: mixed_apply(d1, v, corr_xi, W), lambda W: tridiag_apply(A1, W, 0),
+             lambda W: tridiag_apply(A2, W, 1)]
+    F = lambda AW: AW[0] + AW[1] + AW[2]
+
+    def implicit(Y, base):
+        for (j, axis) in ((1, 0), (2, 1)):
+            Y = line_solve(factors[j - 1], Y - theta * dt * base[j], axis)
+        return Y
+
+    AU = [A(U) for A in apply]
+    Y0 = U + dt * F(AU)
+    (Y0[0], Y0[-1]) = bc
+    Y = implicit(Y0, AU)
+    if scheme == "douglas":
+        return Y
+    AY = [A(Y) for A in apply]
+    if scheme == "cs":
+        return implicit(Y0 + 0.5 * dt * (AY[0] - AU[0]), AU)
+    if scheme == "mcs":
+        return implicit(Y0 + theta * dt * (AY[0] - AU[0]) + (0.5 - theta) * dt * (F(AY) - F(AU)), AU)
+    return implicit(Y0 + 0.5 * dt * (F(AY) - F(AU)), AY)
+
+
+def heston_grid(
+    x_lo: float, x_hi: float, market: dict, payoff: Callable, lower: tuple, upper: tuple, levels: list, S: np.ndarray
+) -> tuple:
+    # solve on the (x, v) grid and return the slice v = v0 (cubic in v), the same result as the 1D solver
+    setting = HESTON_PDE_CONFIG
+    (T, r, q, v0) = (market["T"], market["r"], market["q"], market["sigma"] ** 2)
+    x = MESHES[PDE_CONFIG["mesh"]](x_lo, x_hi, setting["n_space"], np.log(levels))
+    v_max = max(setting["v_max"], 5 * v0, 5 * market["vbar"])
+    v = stretched_grid(0.0, v_max, setting["n_var"], [0.0, v0], setting["v_stretch"])
+    ops = heston_operators(x, v, market)
+
+    (n_time, scheme) = (setting["n_time"], setting["scheme"])
+    (n_damp, dt) = (min(setting["damping_steps"], n_time), T / n_time)
+    steps = [(0.5 * dt, 1.0, "douglas")] * (2 * n_damp) + [(dt, ADI_THETA[scheme], scheme)] * (n_time - n_damp)
+    factors = {(h, theta): (line_factor(ops[0], theta * h, 0), line_factor(ops[1], theta * h, 1))
+               for (h, theta, _) in set(steps)}
+
+    V_T = payoff(x)
+    U = np.repeat(V_T.reshape(len(x), 1, -1), len(v), axis=1)
+    tau = np.cumsum([h for (h, _, _) in steps])
+    U_prev = U
+    for (n, (h, theta, name)) in enumerate(steps):
+        bc = (boundary_value(lower, tau[n], r, q) * np.ones((len(v), 1)),
+              boundary_value(upper, tau[n], r, q) * np.ones((len(v), 1)))
+        (U_prev, U) = (U, adi_step(U, h, theta, name, ops, factors[(h, theta)], v, market["corr"] * market["xi"], bc))
+    at_v0 = lambda W: CubicSpline(v, W, axis=1)(v0).reshape(V_T.shape)
+    return x, at_v0(U), at_v0(U_prev), steps[-1][0]
+
+
+# ------------ 3. Grid results -------------------
+
+class PDEGridResult:
+    # one solve on the log-spot nodes x read at any spots by a cubic spline, outside(S, T) beyond the barriers
+
+    def __init__(self, x, values, values_prev, dt, T, lower=None, upper=None, outside=None, spline=None):
+        self.x = x
+        self.values = values
+        self.values_prev = values_prev
+        self.dt = dt
+        self.T = T
+        self.lower = lower
+        self.upper = upper
+        self.outside = outside
+        self.spline = CubicSpline(x, values) if spline is None else spline
+
+    @property
+    def spot(self):
+        return np.exp(self.x)
+
+    def inside(self, S):
+        return (self.lower is None or S > self.lower) & (self.upper is None or S < self.upper) & np.ones_like(S, bool)
+
+    def read(self, S, on_grid, off_grid):
+        # on_grid(x) for spots inside the barriers, off_grid(S) for the others
+        S = np.asarray(S, dtype=float)
+        inside = self.inside(S)
+        x = np.log(np.clip(S, np.exp(self.x[0]), np.exp(self.x[-1])))
+        val = np.where(inside, on_grid(x), off_grid(S) if not np.all(inside) else 0.0)
+        return val[()]
+
+    def price(self, S):
+        return self.read(S, self.spline, lambda s: self.outside(s, self.T))
+
+    def delta(self, S):
+        h = 1e-4 * np.asarray(S)
+        return self.read(S, lambda x: self.spline(x, 1) / np.exp(x),
+                         lambda s: (self.outside(s + h, self.T) - self.outside(s - h, self.T)) / (2 * h))
+
+    def gamma(self, S):
+        h = 1e-4 * np.asarray(S)
+        return self.read(S, lambda x: (self.spline(x, 2) - self.spline(x, 1)) / np.exp(2 * x),
+                         lambda s: (self.outside(s + h, self.T) - 2 * self.outside(s, self.T) +
+                                    self.outside(s - h, self.T)) / h ** 2)
+
+    def theta(self, S):
+        # calendar time decay over one day, as GREEK_CONFIG["theta"]
+        on_grid = lambda x: (np.interp(x, self.x, self.values_prev) - np.interp(x, self.x, self.values)) / self.dt
+        off_grid = lambda s: (self.outside(s, self.T - self.dt) - self.outside(s, self.T)) / self.dt
+        return self.read(S, on_grid, off_grid) * ONE_DAY
+
+
+# ------------ 4. Instruments ---------------------
+def vanilla_value(trade: dict, omega: int, K: float) -> Callable:
+    # (S, T) -> European value in the model of the trade (Heston when it carries the Heston parameters)
+    (r, q, sigma) = (trade["r"], trade["q"], trade["sigma"])
+    if "kappa" in trade:
+        heston = (trade["kappa"], trade["vbar"], trade["xi"], trade["corr"])
+        return lambda s, t: european_option_heston_cf(omega, s, K, t, r, q, sigma, *heston)
+    return lambda s, t: european_value(omega, s, K, t, r, q, sigma)
+
+
+# column of one trade in a grid solve: barriers, mesh levels, payoff, boundary triples, finish and outside(S, T)
+
+def european_pde(trade: dict) -> dict:
+    (K, omega) = (trade["K"], cp2omega(trade["option_type"]))
+    return dict(
+        bounds=(None, None), levels=[K], payoff=lambda x: vanilla_payoff(x, K, omega),
+        boundary=lambda x_lo, x_hi: (vanilla_boundary(omega, K, x_lo, False), vanilla_boundary(omega, K, x_hi, True)),
+        finish=None, outside=None
+    )
+
+
+def single_touch_pde(trade: dict) -> dict:
+    (r, L, rbt, PaE) = (trade["r"], trade["L"], trade["rbt"], trade["PaE"])
+    eta, touch = get_touch_flag(trade["option_type"])
+
+    # one-touch: rebate at the barrier, nothing far away. No-touch: rbt at expiry unless the barrier is hit
+    (at_barrier, far) = (rebate_boundary(rbt, PaE), ZERO) if touch else (ZERO, (0.0, rbt, 0.0))
+    return dict(
+        bounds=(L, None) if eta == 1 else (None, L), levels=[L], payoff=lambda x: np.full_like(x, (1 - touch) * rbt),
+        boundary=lambda x_lo, x_hi: (at_barrier, far) if eta == 1 else (far, at_barrier),
+        finish=None, outside=lambda s, t: touch * rbt * np.exp(-r * PaE * t) * np.ones_like(s)
+    )
+
+
+def double_touch_pde(trade: dict) -> dict:
+    (r, Ll, Lh) = (trade["r"], trade["Ll"], trade["Lh"])
+    with_l, with_u, no_touch = get_double_touch_flag(trade["option_type"])
+    (lR, uR), (lPaE, uPaE) = split_pair(trade["rbt"]), split_pair(trade["PaE"])
+
+    # touches pay their legs at the barriers, the double no-touch pays lR at expiry inside the corridor
+    (lower, upper) = (ZERO, ZERO) if no_touch else \
+        (rebate_boundary(with_l * lR, lPaE), rebate_boundary(with_u * uR, uPaE))
+    return dict(
+        bounds=(Ll, Lh), levels=[Ll, Lh], payoff=lambda x: np.full_like(x, no_touch * lR),
+        boundary=lambda x_lo, x_hi: (lower, upper), finish=None,
+        outside=lambda s, t: (1 - no_touch) * np.where(s >= Lh, with_u * uR * np.exp(-r * uPaE * t),
+                                                       with_l * lR * np.exp(-r * lPaE * t))
+    )
+
+
+def knock_in_parity(grid: tuple, vanilla: Callable, T: float, r: float, rbt: float) -> tuple:
+    # KI = vanilla + rbt * dfr - KO paying rbt at expiry on hit, on both time levels of the grid
+    (x, V, V_prev, dt) = grid
+    V = vanilla(np.exp(x), T) + rbt * np.exp(-r * T) - V
+    V_prev = vanilla(np.exp(x), T - dt) + rbt * np.exp(-r * (T - dt)) - V_prev
+    return x, V, V_prev, dt
+
+
+def single_barrier_pde(trade: dict) -> dict:
+    (K, T, r, L, rbt, PaE) = (trade["K"], trade["T"], trade["r"], trade["L"], trade["rbt"], trade["PaE"])
+    eta, knockout, omega = get_barrier_flag(trade["option_type"])
+    if knockout == 1:
+        (outside, finish) = (lambda s, t: rbt * np.exp(-r * t * PaE) * np.ones_like(s), None)
+    else:  # knock-in by parity against the KO paying rbt at expiry on hit
+        outside = vanilla_value(trade, omega, K)
+        finish = lambda grid: knock_in_parity(grid, outside, T, r, rbt)
+
+    at_barrier = rebate_boundary(rbt, PaE or knockout == -1)
+    if eta == 1:
+        boundary = lambda x_lo, x_hi: (at_barrier, vanilla_boundary(omega, K, x_hi, True))
+    else:
+        boundary = lambda x_lo, x_hi: (vanilla_boundary(omega, K, x_lo, False), at_barrier)
+    return dict(
+        bounds=(L, None) if eta == 1 else (None, L), levels=[K, L], payoff=lambda x: vanilla_payoff(x, K, omega),
+        boundary=boundary, finish=finish, outside=outside
+    )
+
+
+def double_barrier_pde(trade: dict) -> dict:
+    (K, T, r, Ll, Lh) = (trade["K"], trade["T"], trade["r"], trade["Ll"], trade["Lh"])
+    knockout, omega = get_double_barrier_flag(trade["option_type"])
+    (lR, uR), (lPaE, uPaE) = split_pair(trade["rbt"]), split_pair(trade["PaE"])
+    if knockout == 1:
+        outside = lambda s, t: np.where(s >= Lh, uR * np.exp(-r * t * uPaE), lR * np.exp(-r * t * lPaE))
+        finish = None
+    else:  # knock-in by parity against the KO paying lR at expiry on both barriers, as in the close-form solution
+        outside = vanilla_value(trade, omega, K)
+        finish = lambda grid: knock_in_parity(grid, outside, T, r, lR)
+        (uR, lPaE, uPaE) = (lR, True, True)
+
+    (lower, upper) = (rebate_boundary(lR, lPaE), rebate_boundary(uR, uPaE))
+    return dict(
+        bounds=(Ll, Lh), levels=[K, Ll, Lh], payoff=lambda x: vanilla_payoff(x, K, omega),
+        boundary=lambda x_lo, x_hi: (lower, upper), finish=finish, outside=outside
+    )
+
+
+# ------------ 5. Pricers --------------------------
+
+# market data each grid solver's operator depends on
+GRID_MARKETS = {bs_grid: ("T", "r", "q", "sigma"), heston_grid: ("T", "r", "q", "sigma", "kappa", "vbar", "xi", "corr")}
+
+
+def solve_columns(columns: list, S: np.ndarray, market: dict, grid_solver: Callable) -> list:
+    # trades sharing the operator and the grid ends: one grid, every payoff a column, a PDEGridResult per trade
+    (T, bounds) = (market["T"], columns[0]["bounds"])
+    levels = [level for column in columns for level in column["levels"]]
+    vol = np.sqrt(max(market["sigma"] ** 2, market.get("vbar", 0.0)))
+    (x_lo, x_hi) = log_domain(S, T, vol, levels, *bounds)
+    ends = [column["boundary"](x_lo, x_hi) for column in columns]
+    (lower, upper) = [tuple(np.array([end[side][i] for end in ends]) for i in range(3)) for side in (0, 1)]
+    payoff = lambda x: np.column_stack([column["payoff"](x) for column in columns])
+    (x, V, V_prev, dt) = grid_solver(x_lo, x_hi, market, payoff, lower, upper, levels, S)
+
+    grids = [(x, V[:, j], V_prev[:, j], dt) for j in range(len(columns))]
+    grids = [grid if column["finish"] is None else column["finish"](grid) for (grid, column) in zip(grids, columns)]
+    # one spline through all the columns, each result takes its own coefficients
+    coef = CubicSpline(x, np.column_stack([grid[1] for grid in grids])).c
+    return [PDEGridResult(*grid, T, *bounds, outside=column["outside"], spline=PPoly.construct_fast(coef[..., j], x))
+            for (j, (grid, column)) in enumerate(zip(grids, columns))]
+
+
+def pde_price(
+    solver: Callable, trade: dict, return_grid: bool = False, grid_solver: Callable = bs_grid
+) -> Union[Numeric, PDEGridResult]:
+    # one column per trade apart from spot, one solve per operator and grid ends, return_grid: the PDEGridResult
+    (shape, rows) = trade_rows(trade)
+    spots = np.broadcast_to(np.asarray(trade["S"], dtype=float), shape).ravel()
+    trades = {}
+    for (n, (idx, trade_i)) in enumerate(rows):
+        key = repr([(k, v) for k, v in trade_i.items() if k != "S"])
+        trades.setdefault(key, (trade_i, []))[1].append(n)
+    market_of = lambda trade_i: {k: float(trade_i[k]) for k in GRID_MARKETS[grid_solver]}
+
+    if return_grid:
+        if len(trades) > 1:
+            raise ValueError("return_grid needs trades that differ only in spot")
+        (trade_i, flat) = next(iter(trades.values()))
+        return solve_columns([solver(trade_i)], spots, market_of(trade_i), grid_solver)[0]
+
+    groups = {}
+    for (trade_i, flat) in trades.values():
+        (column, market) = (solver(trade_i), market_of(trade_i))
+        groups.setdefault(repr((market, column["bounds"])), (market, []))[1].append((column, flat))
+
+    price = np.empty(shape)
+    for (market, members) in groups.values():
+        S = spots[np.concatenate([flat for (column, flat) in members])]
+        results = solve_columns([column for (column, flat) in members], S, market, grid_solver)
+        for (result, (column, flat)) in zip(results, members):
+            price.flat[flat] = result.price(spots[flat])
+    return price[()]
+
+
+def european_option_bs_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric,
+    return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    return pde_price(european_pde, dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma), return_grid)
+
+
+def single_touch_option_bs_pde(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE)
+    return pde_price(single_touch_pde, trade, return_grid)
+
+
+def double_touch_option_bs_pde(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True,
+    return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE)
+    return pde_price(double_touch_pde, trade, return_grid)
+
+
+def single_barrier_option_bs_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: Union[bool, np.ndarray] = True, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE)
+    return pde_price(single_barrier_pde, trade, return_grid)
+
+
+def double_barrier_option_bs_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list[Numeric]] = 1.0, PaE: Union[bool, np.ndarray, list] = True,
+    return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE)
+    return pde_price(double_barrier_pde, trade, return_grid)
+
+
+def european_option_heston_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, kappa: Numeric = 2.0,
+    vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, kappa=kappa, vbar=vbar, xi=xi,
+                 corr=corr)
+    return pde_price(european_pde, trade, return_grid, heston_grid)
+
+
+def single_touch_option_heston_pde(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric, rbt: Numeric = 1.0,
+    PaE: bool = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7,
+    return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE, kappa=kappa,
+                 vbar=vbar, xi=xi, corr=corr)
+    return pde_price(single_touch_pde, trade, return_grid, heston_grid)
+
+
+def double_touch_option_heston_pde(
+    option_type: str, S: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric, Lh: Numeric,
+    rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04,
+    xi: Numeric = 0.3, corr: Numeric = -0.7, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE,
+                 kappa=kappa, vbar=vbar, xi=xi, corr=corr)
+    return pde_price(double_touch_pde, trade, return_grid, heston_grid)
+
+
+def single_barrier_option_heston_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, L: Numeric,
+    rbt: Numeric = 1.0, PaE: bool = True, kappa: Numeric = 2.0, vbar: Numeric = 0.04, xi: Numeric = 0.3,
+    corr: Numeric = -0.7, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, L=L, rbt=rbt, PaE=PaE, kappa=kappa,
+                 vbar=vbar, xi=xi, corr=corr)
+    return pde_price(single_barrier_pde, trade, return_grid, heston_grid)
+
+
+def double_barrier_option_heston_pde(
+    option_type: str, S: Numeric, K: Numeric, T: Numeric, r: Numeric, q: Numeric, sigma: Numeric, Ll: Numeric,
+    Lh: Numeric, rbt: Union[Numeric, list] = 1.0, PaE: Union[bool, list] = True, kappa: Numeric = 2.0,
+    vbar: Numeric = 0.04, xi: Numeric = 0.3, corr: Numeric = -0.7, return_grid: bool = False
+) -> Union[Numeric, PDEGridResult]:
+    trade = dict(option_type=option_type, S=S, K=K, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE,
+                 kappa=kappa, vbar=vbar, xi=xi, corr=corr)
+    return pde_price(double_barrier_pde, trade, return_grid, heston_grid)
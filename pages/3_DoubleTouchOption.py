@@ -22,6 +22,9 @@ with col1:
     st.header(f"⚙️ :{color}[**Settings**]")
     model = st.selectbox(f":{color}[**Pricing Model**]", ["Black-Scholes", "Heston"], index=0)
     method = st.selectbox(f":{color}[**Pricing Method**]", ["Close-Form", "Monte Carlo", "PDE Finite Difference"], index=0)
+    if method == "Monte Carlo":
+        sampler = st.radio(f":{color}[**Sampler**]", ["pseudo", "sobol"], horizontal=True,
+                           format_func=lambda m: {"pseudo": "Pseudo-Random", "sobol": "Sobol QMC"}[m])
     selected_greeks = st.multiselect(f":{color}[**Choose greeks**]", options=GREEKS, default=[DELTA, GAMMA, VEGA, THETA])
     st.markdown("---")
     show_button = st.button("🚀 Show", use_container_width=True)
@@ -60,6 +63,11 @@ with col3:
     r = st.number_input(f":{color}[**Domestic Rate (%)**]", value=3.0)
     q = st.number_input(f":{color}[**Foreign Rate (%)**]", value=1.0)
     sigma = st.number_input(f":{color}[**Volatility (%)**]", value=25.0)
+    if model == "Heston":
+        kappa = st.number_input(f":{color}[**Mean Reversion**]", value=2.0)
+        vbar = st.number_input(f":{color}[**Long-Run Volatility (%)**]", value=20.0)
+        xi = st.number_input(f":{color}[**Vol of Vol (%)**]", value=30.0)
+        corr = st.number_input(f":{color}[**Spot-Vol Correlation**]", value=-0.7, min_value=-1.0, max_value=1.0)
 
 r /= 100.0
 q /= 100.0
@@ -67,6 +75,10 @@ sigma /= 100.0
 PaE = ["expiry" in p.lower() for p in pay_mode] if is_dot else ("expiry" in pay_mode.lower())
 
 params = dict(option_type=option_type, S=S, T=T, r=r, q=q, sigma=sigma, Ll=Ll, Lh=Lh, rbt=rbt, PaE=PaE)
+if model == "Heston":
+    params.update(kappa=kappa, vbar=(vbar / 100.0) ** 2, xi=xi / 100.0, corr=corr)
+if method == "Monte Carlo":
+    params.update(sampler=sampler)
 inst_name = "Double Touch Option"
 
 if show_button:
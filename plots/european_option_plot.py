@@ -11,12 +11,11 @@ def plot_price(
 ) -> go.Figure:
     spot = param[anchor]
     """Plot Option Premium vs Spot Price"""
+    # one call over the whole spot ladder: a single solve for the PDE pricers, one array pass for the others
     underlying_vec = np.linspace(LB * spot, UB * spot, NUM_OF_PT)
-    payoff_vec, premium_vec = [], []
-    for Si in underlying_vec:
-        param_i = {**param, anchor: Si}
-        payoff_vec.append(get_payoff(instrument=instrument, param=param_i))
-        premium_vec.append(get_price(model=model, instrument=instrument, method=method, param=param_i))
+    param_vec = {**param, anchor: underlying_vec}
+    payoff_vec = get_payoff(instrument=instrument, param=param_vec)
+    premium_vec = get_price(model=model, instrument=instrument, method=method, param=param_vec)
 
     fig = go.Figure()
     fig.add_trace(
@@ -49,15 +48,14 @@ def plot_greeks(
 ) -> go.Figure:
     spot = param[anchor]
     underlying_vec = np.linspace(LB * spot, UB * spot, NUM_OF_PT)
-
-    greek_res = []
-    for Si in underlying_vec:
-        param_i = {**param, anchor: Si}
-        greek_res.append(
-            get_greeks(model=model, instrument=instrument, method=method, param=param_i, selected=selected)
-        )
-
-    l = len(greek_res[0])
+    # one call over the whole spot ladder, every greek comes back as an array over underlying_vec
+    param_vec = {**param, anchor: underlying_vec}
+    greek_res = get_greeks(model=model, instrument=instrument, method=method, param=param_vec, selected=selected)
+
+    # exact greeks to compare against, from an engine that has all the selected ones
+    reference = next((label for label in ("Analytical", "Automatic") if set(selected) <= set(greek_res.get(label, {}))),
+                     None)
+    l = 1 if reference is None else 2
     num_rows = l * len(selected)
 
     if l == 1:
@@ -69,14 +67,14 @@ def plot_greeks(
         fig = make_subplots(
             rows=num_rows, cols=1, shared_xaxes=False, vertical_spacing=0.03,
             subplot_titles=[
-                f"{greek.title()} (Analytical vs Numerical)" if i % 2 == 0 else f"{greek.title()} (Spread)"
+                f"{greek.title()} ({reference} vs Numerical)" if i % 2 == 0 else f"{greek.title()} (Spread)"
                 for greek in selected for i in range(2)
             ]
         )
 
     for i, greek in enumerate(selected):
         if l == 1:
-            greek_num_vec = [res["Numerical"][greek] for res in greek_res]
+            greek_num_vec = greek_res["Numerical"][greek]
             fig.add_trace(
                 go.Scatter(x=underlying_vec, y=greek_num_vec, mode="markers+lines", name=f"{greek.title()} Numerical"),
                 row=i+1, col=1
@@ -87,15 +85,15 @@ def plot_greeks(
             fig.update_yaxes(title_text="Value", row=i+1, col=1)
 
         else:
-            greek_ana_vec = [res["Analytical"][greek] for res in greek_res]
-            greek_num_vec = [res["Numerical"][greek] for res in greek_res]
-            greek_spread_vec = [a - n for a, n in zip(greek_ana_vec, greek_num_vec)]
+            greek_ana_vec = greek_res[reference][greek]
+            greek_num_vec = greek_res["Numerical"][greek]
+            greek_spread_vec = greek_ana_vec - greek_num_vec
 
             row_value = 2 * i + 1
             row_spread = 2 * i + 2
 
             fig.add_trace(
-                go.Scatter(x=underlying_vec, y=greek_ana_vec, mode="markers+lines", name=f"{greek.title()} Analytical"),
+                go.Scatter(x=underlying_vec, y=greek_ana_vec, mode="markers+lines", name=f"{greek.title()} {reference}"),
                 row=row_value, col=1
             )
             fig.add_trace(
@@ -1,12 +1,56 @@
 from utils.constants import ONE_DAY
 
+# complex_step: Im V(x + ih) / h for the complex-safe pricers, None (default) bumps, 1e-20 switches it on
 GREEK_CONFIG = {
 
-    "delta": {'shock_mode': 'center', 'shock_type': 'relative', 'shock_magnitude': 1, 'shock_unit': '%'},
+    "delta": {'shock_mode': 'center', 'shock_type': 'relative', 'shock_magnitude': 1, 'shock_unit': '%',
+              'complex_step': None},
     "gamma": {'shock_mode': 'center', 'shock_type': 'relative', 'shock_magnitude': 1, 'shock_unit': '%'},
-    "vega": {'shock_mode': 'up', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': '%'},
-    "rho": {'shock_mode': 'up', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': 'bp'},
+    "vega": {'shock_mode': 'up', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': '%',
+             'complex_step': None},
+    "rho": {'shock_mode': 'up', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': 'bp',
+            'complex_step': None},
     "volga": {'shock_mode': 'center', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': '%'},
     "vanna": {'shock_mode': 'center', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': '%'},
-    "theta": {'shock_mode': 'down', 'shock_type': 'absolute', 'shock_magnitude': ONE_DAY, 'shock_unit': ''}
+    "theta": {'shock_mode': 'down', 'shock_type': 'absolute', 'shock_magnitude': ONE_DAY, 'shock_unit': ''},
+    "speed": {'shock_mode': 'center', 'shock_type': 'relative', 'shock_magnitude': 1, 'shock_unit': '%'},
+    "zomma": {'shock_mode': 'center', 'shock_type': 'absolute', 'shock_magnitude': 1, 'shock_unit': '%'},
+    "color": {'shock_mode': 'down', 'shock_type': 'absolute', 'shock_magnitude': ONE_DAY, 'shock_unit': ''},
+    "charm": {'shock_mode': 'down', 'shock_type': 'absolute', 'shock_magnitude': ONE_DAY, 'shock_unit': ''},
+    "veta": {'shock_mode': 'down', 'shock_type': 'absolute', 'shock_magnitude': ONE_DAY, 'shock_unit': ''}
 }
+
+# stacked: all bumps in one pricer call up to max_rows rows, adaptive: Richardson steps up to budget calls or tol
+FD_GREEK_CONFIG = {'stacked': True, 'max_rows': 4096, 'adaptive': False, 'budget': 11, 'tol': 1e-6}
+
+# image series of the double touch / barrier solutions: adaptive (tol) or fixed (k = -fixed_terms, ..., fixed_terms)
+IMAGE_SERIES_CONFIG = {'truncation': 'adaptive', 'tol': 1e-10, 'max_terms': 500, 'fixed_terms': 6}
+
+# backend: "special" (scipy.special ufuncs) or "scipy" (scipy.stats.norm)
+NORMAL_CONFIG = {'backend': 'special'}
+
+# Heston Lewis integral: Gauss-Legendre panels up to where |integrand| < tol
+HESTON_QUAD_CONFIG = {'panel_nodes': 16, 'panel_width': 16.0, 'tol': 1e-14, 'u_cap': 1e4, 'chunk': 8192}
+
+# Carr-Madan FFT: n points, integration step eta, damping alpha
+FFT_CONFIG = {'n': 4096, 'eta': 0.25, 'alpha': 1.5}
+
+# sampler: "pseudo" or "sobol" (n_scrambles scrambles), results do not depend on n_workers
+MC_CONFIG = {
+    'n_paths': 20000, 'n_steps': 32, 'chunk': 50000, 'seed': 2025, 'sampler': 'pseudo', 'n_scrambles': 16,
+    'n_workers': 1, 'pathwise_bump': 1e-4
+}
+
+# mesh: "uniform" or "stretched" around strike and barriers, tol: None for a fixed grid, else doubled up to n_max
+PDE_CONFIG = {
+    'n_space': 400, 'n_time': 400, 'n_sd': 5.0, 'rannacher_steps': 2,
+    'mesh': 'stretched', 'stretch': 0.1, 'tol': None, 'n_min': 50, 'n_max': 1600
+}
+
+# scheme: "douglas", "cs", "mcs" or "hv", damping_steps implicit Douglas half steps
+HESTON_PDE_CONFIG = {
+    'n_space': 120, 'n_var': 60, 'n_time': 60, 'v_max': 1.0, 'v_stretch': 0.02, 'scheme': 'hv', 'damping_steps': 2
+}
+
+# rows per pricer call of get_book_prices / get_book_greeks
+BOOK_CONFIG = {'chunk': 262144}
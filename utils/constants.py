@@ -12,7 +12,12 @@ RHO = "rho"
 THETA = "Theta"
 VANNA = "Vanna"
 VOLGA = "Volga"
-GREEKS = [DELTA, GAMMA, VEGA, THETA, RHO, VOLGA, VANNA]
+SPEED = "Speed"
+ZOMMA = "Zomma"
+COLOR = "Color"
+CHARM = "Charm"
+VETA = "Veta"
+GREEKS = [DELTA, GAMMA, VEGA, THETA, RHO, VOLGA, VANNA, SPEED, ZOMMA, COLOR, CHARM, VETA]
 
 PLOT_STYLE = "plotly_dark"
 BO_HE_LV = "#00b4d8"
@@ -1,9 +1,37 @@
+from enum import Enum
+from typing import Callable, Union
+
+import numpy as np
+
+
+def map_codes(option_type: Union[list, np.ndarray], flag_func: Callable) -> Union[np.ndarray, list[np.ndarray]]:
+    # evaluate flag_func once per distinct option code and scatter the flags back over the array of codes
+    codes = np.asarray(option_type)
+    if codes.dtype == object:  # e.g. an array of enum members
+        codes = np.array([getattr(c, "value", c) for c in codes.ravel()]).reshape(codes.shape)
+    uniq, inv = np.unique(np.char.upper(codes.astype(str)).ravel(), return_inverse=True)
+    flags = np.array([flag_func(str(u)) for u in uniq])[inv.reshape(codes.shape)]
+    return flags if flags.ndim == codes.ndim else list(np.moveaxis(flags, -1, 0))
+
+
+def is_code(option_type) -> bool:
+    return isinstance(option_type, (str, Enum))
+
 
 def cp2omega(option_type: str) -> int:
+    if not is_code(option_type):
+        flag = np.asarray(option_type)
+        if flag.dtype.kind == 'b':  # call = True, put = False
+            return np.where(flag, 1, -1)
+        if flag.dtype.kind in 'iuf':  # call = 1, put = -1 (or 0)
+            return np.where(flag > 0, 1, -1)
+        return map_codes(option_type, cp2omega)
     return 1 if option_type.upper() in ("C", "CALL") else -1  # call = 1, put = -1
 
 
 def get_touch_flag(option_type: str) -> list[int]:
+    if not is_code(option_type):
+        return map_codes(option_type, get_touch_flag)
     flag = [
         1 if option_type[2].upper() == 'D' else -1,   # down = 1,  up = -1
         1 if option_type[:2].upper() == 'OT' else 0   # touch = 1, no-touch = 0
@@ -11,10 +39,34 @@ def get_touch_flag(option_type: str) -> list[int]:
     return flag
 
 
+def get_double_touch_flag(option_type: str) -> list[int]:
+    if not is_code(option_type):
+        return map_codes(option_type, get_double_touch_flag)
+    option_type = option_type.upper()
+    flag = [
+        1 if option_type in ("OTDNTU", "DOT", "DNT") else 0,  # lower rebate leg included = 1
+        1 if option_type in ("OTUNTD", "DOT", "DNT") else 0,  # upper rebate leg included = 1
+        1 if option_type == "DNT" else 0                      # no-touch = 1, one-touch = 0
+    ]
+    return flag
+
+
 def get_barrier_flag(option_type: str) -> list[int]:
+    if not is_code(option_type):
+        return map_codes(option_type, get_barrier_flag)
     flag = [
         1 if option_type[0].upper() == 'D' else -1,   # down = 1,      up = -1
         1 if option_type[1].upper() == 'O' else -1,   # knock-out = 1, knock-in = -1
         1 if option_type[2].upper() == 'C' else -1    # call = 1,      put = -1
     ]
     return flag
+
+
+def get_double_barrier_flag(option_type: str) -> list[int]:
+    if not is_code(option_type):
+        return map_codes(option_type, get_double_barrier_flag)
+    flag = [
+        1 if option_type[2].upper() == 'O' else -1,   # knock-out = 1, knock-in = -1
+        1 if option_type[-1].upper() == 'C' else -1   # call = 1,      put = -1
+    ]
+    return flag
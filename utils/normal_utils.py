@@ -0,0 +1,23 @@
+import numpy as np
+from scipy.special import ndtr
+from scipy.stats import norm
+
+from utils.configs import NORMAL_CONFIG
+
+INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def ncdf(x):
+    # standard normal cdf, scipy.special.ndtr skips the argument checking of the frozen scipy.stats.norm
+    return norm.cdf(x) if NORMAL_CONFIG["backend"] == "scipy" else ndtr(x)
+
+
+def npdf(x):
+    # standard normal pdf
+    return norm.pdf(x) if NORMAL_CONFIG["backend"] == "scipy" else INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def ncdf_pair(omega, d1, d2) -> tuple:
+    # (N(omega * d1), N(omega * d2)) from a single cdf call over the stacked pair, one pair per broadcast trade
+    (omega, d1, d2) = np.broadcast_arrays(omega, d1, d2)
+    return tuple(ncdf(omega * np.stack([d1, d2])))
@@ -1,8 +1,14 @@
+from inspect import signature
 from typing import Union
 
-from greeks.analytical import BSGreeks, HestonGreeks
-from greeks.numerical import FDGreeks
-from methods import close_form
+import numpy as np
+
+from greeks.analytical import (BSGreeks, DoubleBarrierGreeks, DoubleTouchGreeks, HestonGreeks, SingleBarrierGreeks,
+                               SingleTouchGreeks)
+from greeks.automatic import ADGreeks
+from greeks.numerical import FDGreeks, GridGreeks, MCGreeks
+from methods import close_form, fourier, monte_carlo, pde_finite_difference
+from utils.configs import BOOK_CONFIG, FD_GREEK_CONFIG
 
 # ------------ 0. 支付函数注册 -----------------
 PAYOFFS = {
@@ -18,71 +24,100 @@ PRICERS = {
     "Black-Scholes": {
         "European Option": {
             "Close-Form": close_form.european_option_bs_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.european_option_bs_pde,
+            "Monte Carlo": monte_carlo.european_option_bs_mc,
+            "FFT": fourier.european_option_bs_fft,
         },
         "Single Touch Option": {
             "Close-Form": close_form.single_touch_option_bs_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.single_touch_option_bs_pde,
+            "Monte Carlo": monte_carlo.single_touch_option_bs_mc,
         },
         "Double Touch Option": {
             "Close-Form": close_form.double_touch_option_bs_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.double_touch_option_bs_pde,
+            "Monte Carlo": monte_carlo.double_touch_option_bs_mc,
         },
         "Single Barrier Option": {
             "Close-Form": close_form.single_barrier_option_bs_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.single_barrier_option_bs_pde,
+            "Monte Carlo": monte_carlo.single_barrier_option_bs_mc,
         },
         "Double Barrier Option": {
             "Close-Form": close_form.double_barrier_option_bs_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.double_barrier_option_bs_pde,
+            "Monte Carlo": monte_carlo.double_barrier_option_bs_mc,
         },
     },
     "Heston": {
         "European Option": {
             "Close-Form": close_form.european_option_heston_cf,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.european_option_heston_pde,
+            "Monte Carlo": monte_carlo.european_option_heston_mc,
+            "FFT": fourier.european_option_heston_fft,
         },
         "Single Touch Option": {
             "Close-Form": None,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.single_touch_option_heston_pde,
+            "Monte Carlo": monte_carlo.single_touch_option_heston_mc,
         },
         "Double Touch Option": {
             "Close-Form": None,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.double_touch_option_heston_pde,
+            "Monte Carlo": monte_carlo.double_touch_option_heston_mc,
         },
         "Single Barrier Option": {
             "Close-Form": None,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.single_barrier_option_heston_pde,
+            "Monte Carlo": monte_carlo.single_barrier_option_heston_mc,
         },
         "Double Barrier Option": {
             "Close-Form": None,
-            "PDE Finite Difference": None,
-            "Monte Carlo": None,
+            "PDE Finite Difference": pde_finite_difference.double_barrier_option_heston_pde,
+            "Monte Carlo": monte_carlo.double_barrier_option_heston_mc,
         },
     }
 }
 
 # ------------ 2. Greeks 引擎注册 -------------
-num_greeks_factory = lambda function, parameter: FDGreeks(function, parameter)
+# pricers analytic in their real inputs (no real-part casts, roundings or bincounts): complex-step numerical greeks
+COMPLEX_STEP_PRICERS = {
+    close_form.european_option_bs_cf, close_form.single_touch_option_bs_cf, close_form.single_barrier_option_bs_cf
+}
+num_greeks_factory = lambda function, parameter: FDGreeks(function, parameter, function in COMPLEX_STEP_PRICERS)
+ad_greeks_factory = lambda function, parameter: ADGreeks(function, parameter)  # close-form pricers only
+# numerical greeks of the methods that differentiate their own price: the Monte Carlo paths and the PDE grid
+METHOD_GREEK_FACTORIES = {
+    "Monte Carlo": lambda function, parameter: MCGreeks(function, parameter),
+    "PDE Finite Difference": lambda function, parameter: GridGreeks(function, parameter),
+}
 GREEK_ENGINES = {
     "Black-Scholes": {
         "European Option": {
             "analytical": lambda parameter: BSGreeks(**parameter),
             "numerical": num_greeks_factory,
+            "automatic": ad_greeks_factory,
+        },
+        "Single Touch Option": {
+            "analytical": lambda parameter: SingleTouchGreeks(**parameter),
+            "numerical": num_greeks_factory,
+            "automatic": ad_greeks_factory,
+        },
+        "Double Touch Option": {
+            "analytical": lambda parameter: DoubleTouchGreeks(**parameter),
+            "numerical": num_greeks_factory,
+            "automatic": ad_greeks_factory,
+        },
+        "Single Barrier Option": {
+            "analytical": lambda parameter: SingleBarrierGreeks(**parameter),
+            "numerical": num_greeks_factory,
+            "automatic": ad_greeks_factory,
+        },
+        "Double Barrier Option": {
+            "analytical": lambda parameter: DoubleBarrierGreeks(**parameter),
+            "numerical": num_greeks_factory,
+            "automatic": ad_greeks_factory,
         },
-        "Single Touch Option": {"numerical": num_greeks_factory},
-        "Double Touch Option": {"numerical": num_greeks_factory},
-        "Single Barrier Option": {"numerical": num_greeks_factory},
-        "Double Barrier Option": {"numerical": num_greeks_factory},
     },
     "Heston": {
         "European Option": {
@@ -100,7 +135,10 @@ GREEK_ENGINES = {
 # ------------ 3. 公共工具函数 ----------------
 def get_payoff(instrument: str, param: dict) -> Union[None, float]:
     payoff = PAYOFFS.get(instrument)
-    return None if payoff is None else payoff(**param)
+    if payoff is None:
+        return None
+    # the payoff does not depend on the model parameters (kappa, vbar, ... of Heston)
+    return payoff(**{k: v for k, v in param.items() if k in signature(payoff).parameters})
 
 
 def get_price(model: str, instrument: str, method: str, param: dict) -> Union[None, float]:
@@ -110,11 +148,77 @@ def get_price(model: str, instrument: str, method: str, param: dict) -> Union[No
 
 def get_greeks(model: str, instrument: str, method: str, param: dict, selected: list[str]) -> Union[None, dict]:
     func = PRICERS.get(model).get(instrument).get(method)
-    engine = GREEK_ENGINES.get(model).get(instrument)
-    if not func or not engine or not selected:
+    engines = GREEK_ENGINES.get(model).get(instrument)
+    if not func or not engines or not selected:
         return None
     out = {}
-    for label, factory in engine.items():
-        engine = factory(param) if label.lower() == "analytical" else factory(func, param)
-        out[label.capitalize()] = {g: getattr(engine, g.lower()) for g in selected}
+    for label, factory in engines.items():
+        if label.lower() == "analytical":  # trade and model inputs only, e.g. no sampler of the Monte Carlo pricers
+            close_form = signature(PRICERS[model][instrument]["Close-Form"]).parameters
+            engine = factory({k: v for k, v in param.items() if k in close_form})
+        elif label.lower() == "automatic":  # differentiates through the close-form pricer itself
+            if method != "Close-Form":
+                continue
+            engine = factory(func, param)
+        elif method in METHOD_GREEK_FACTORIES:
+            engine = METHOD_GREEK_FACTORIES[method](func, param)
+        else:
+            engine = factory(func, param)
+            if FD_GREEK_CONFIG["stacked"]:  # all bump scenarios in one pricer call
+                engine.stack(selected)
+        # an engine reports the greeks it has, e.g. the second-order AD engine has no speed
+        out[label.capitalize()] = {g: getattr(engine, g.lower()) for g in selected if hasattr(type(engine), g.lower())}
+    return out
+
+
+# ------------ 4. 组合批量接口 ----------------
+# book: dict of columns "model", "instrument", "method" and the pricer inputs, a tuple of two is a (lower, upper) pair
+BOOK_KEYS = ("model", "instrument", "method")
+
+
+def factorize(column: np.ndarray) -> tuple:
+    # distinct labels and the label index of every row, one equality pass per label instead of np.unique's sort
+    (labels, codes) = ([], np.full(column.shape, -1))
+    while (todo := np.flatnonzero(codes < 0)).size:
+        labels.append(column[todo[0]])
+        codes[column == labels[-1]] = len(labels) - 1
+    return labels, codes
+
+
+def book_groups(book: dict):
+    # (model, instrument, method, pricer, rows, param) per slice of BOOK_CONFIG["chunk"] rows, scalars repeated
+    columns = {k: tuple(map(np.asarray, v)) if isinstance(v, tuple) else np.asarray(v) for k, v in book.items()}
+    keys = [factorize(np.ravel(columns[k])) for k in BOOK_KEYS]
+    code = np.ravel_multi_index([codes for _, codes in keys], [len(labels) for labels, _ in keys])
+    order = np.argsort(code, kind="stable")
+
+    for group in np.split(order, np.flatnonzero(np.diff(code[order])) + 1):
+        (model, instrument, method) = (str(labels[codes[group[0]]]) for labels, codes in keys)
+        pricer = PRICERS.get(model, {}).get(instrument, {}).get(method)
+        if pricer is None:
+            continue
+        inputs = signature(pricer).parameters
+        for rows in np.split(group, np.arange(BOOK_CONFIG["chunk"], group.size, BOOK_CONFIG["chunk"])):
+            take = lambda col: np.repeat(col, rows.size) if col.ndim == 0 else col[rows]
+            legs = lambda pair: tuple(map(take, pair)) if "Lh" in inputs else take(pair[0])
+            param = {k: legs(v) if isinstance(v, tuple) else take(v) for k, v in columns.items() if k in inputs}
+            yield model, instrument, method, pricer, rows, param
+
+
+def get_book_prices(book: dict) -> np.ndarray:
+    # one pricer call per group of the book, prices in the row order of the book (NaN where no pricer is registered)
+    out = np.full(len(book["instrument"]), np.nan)
+    for (_, _, _, pricer, rows, param) in book_groups(book):
+        out[rows] = pricer(**param)
+    return out
+
+
+def get_book_greeks(book: dict, selected: list[str]) -> dict:
+    # {engine label: {greek: column in the row order of the book}}, NaN where there is no such engine or greek
+    n = len(book["instrument"])
+    out = {}
+    for (model, instrument, method, _, rows, param) in book_groups(book):
+        for label, greeks in (get_greeks(model, instrument, method, param, selected) or {}).items():
+            for g, value in greeks.items():
+                out.setdefault(label, {}).setdefault(g, np.full(n, np.nan))[rows] = value
     return out
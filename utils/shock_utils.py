@@ -9,6 +9,8 @@ def scheme2weight(scheme: str, order: int) -> list:
         w = [1, 0] if forward_scheme else [1, -1] if center_scheme else [0, -1]
     elif order == 2:
         w = [2, 1, 0] if forward_scheme else [1, 0, -1] if center_scheme else [0, -1, -2]
+    elif order == 3:
+        w = [3, 2, 1, 0] if forward_scheme else [2, 1, 0, -1] if center_scheme else [0, -1, -2, -3]
     else:
         w = []
     return w